@@ -0,0 +1,128 @@
+import mmap
+import struct
+
+import numpy as np
+
+from backend.packed import PackedIR, pack_ir
+
+# ------------------------
+# Binary IR Format
+# ------------------------
+# Little-endian layout:
+#
+#   header     magic "QIRB", u16 version, u16 reserved, then u32 counts of
+#              qubits, names, constants, instructions, operands and matrices
+#   names      u32 byte length + UTF-8 bytes per name (qubits come first)
+#   constants  u32 byte length + ASCII decimal digits per constant
+#   opcodes    int8 per instruction, zero-padded to a multiple of 4 bytes
+#   offsets    int32 * (instructions + 1)
+#   operands   int32 * operands, zero-padded to a multiple of 8 bytes
+#   matrices   complex128 * 4 per matrix (row-major 2x2, "unitary" ops)
+#
+# The arrays are aligned to their item size, so a memory-mapped file can be
+# viewed with np.frombuffer without copying. Version 1 files (no matrix count
+# or table) are still read. Every encoding is a multiple of 8 bytes long, so
+# several can be sent back to back (loads_binary_many).
+
+MAGIC = b"QIRB"
+VERSION = 2
+MIMETYPE = "application/x-qucpl-ir"
+
+_HEADERS = {1: struct.Struct("<4sHH5I"), 2: struct.Struct("<4sHH6I")}
+_HEADER = _HEADERS[VERSION]
+_VERSION = struct.Struct("<H")
+_LENGTH = struct.Struct("<I")
+
+
+def is_binary_ir(data):
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def _pad(n, align=4):
+    return (-n) % align
+
+
+def dumps_binary(ir):
+    packed = ir if isinstance(ir, PackedIR) else pack_ir(ir)
+    parts = [_HEADER.pack(
+        MAGIC, VERSION, 0,
+        len(packed.qubits), len(packed.names), len(packed.constants),
+        len(packed.opcodes), len(packed.operands), len(packed.matrices),
+    )]
+    for text in list(packed.names) + [str(int(c)) for c in packed.constants]:
+        encoded = text.encode("utf-8")
+        parts.append(_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+
+    size = sum(len(p) for p in parts)
+    parts.append(b"\0" * _pad(size))
+    opcodes = packed.opcodes.astype("<i1").tobytes()
+    parts.append(opcodes + b"\0" * _pad(len(opcodes)))
+    parts.append(packed.offsets.astype("<i4").tobytes())
+    parts.append(packed.operands.astype("<i4").tobytes())
+    parts.append(b"\0" * _pad(sum(len(p) for p in parts), 8))
+    parts.append(packed.matrices.astype("<c16").tobytes())
+    return b"".join(parts)
+
+
+def loads_binary(data):
+    # `data` may be bytes, a memoryview or an mmap; the arrays are views into it
+    return _loads_at(data, 0)[0]
+
+
+def loads_binary_many(data):
+    # Binary IRs written back to back
+    irs, pos = [], 0
+    while pos < len(data):
+        ir, pos = _loads_at(data, pos)
+        irs.append(ir)
+    return irs
+
+
+def _loads_at(data, start):
+    # The IR starting at byte `start`, and where the next one would start
+    if len(data) - start < _HEADERS[1].size or not is_binary_ir(data[start:start + len(MAGIC)]):
+        raise ValueError("Not a binary QuCPL IR file")
+    (version,) = _VERSION.unpack_from(data, start + len(MAGIC))
+    if version not in _HEADERS:
+        raise ValueError(f"Unsupported binary IR version {version} (expected {VERSION})")
+    header = _HEADERS[version]
+    counts = header.unpack_from(data, start)[3:]
+    num_qubits, num_names, num_constants, num_instructions, num_operands = counts[:5]
+    num_matrices = counts[5] if version >= 2 else 0
+
+    pos = start + header.size
+    strings = []
+    for _ in range(num_names + num_constants):
+        (length,) = _LENGTH.unpack_from(data, pos)
+        pos += _LENGTH.size
+        strings.append(bytes(data[pos:pos + length]).decode("utf-8"))
+        pos += length
+    pos += _pad(pos - start)
+
+    opcodes = np.frombuffer(data, dtype="<i1", count=num_instructions, offset=pos)
+    pos += num_instructions + _pad(num_instructions)
+    offsets = np.frombuffer(data, dtype="<i4", count=num_instructions + 1, offset=pos)
+    pos += 4 * (num_instructions + 1)
+    operands = np.frombuffer(data, dtype="<i4", count=num_operands, offset=pos)
+    pos += 4 * num_operands
+    pos += _pad(pos - start, 8)
+    matrices = None
+    if num_matrices:
+        matrices = np.frombuffer(data, dtype="<c16", count=4 * num_matrices, offset=pos).reshape(-1, 2, 2)
+        pos += 64 * num_matrices
+
+    names = strings[:num_names]
+    constants = [int(c) for c in strings[num_names:]]
+    return PackedIR(names[:num_qubits], names, constants, opcodes, offsets, operands, matrices), pos
+
+
+def dump_binary(ir, path):
+    with open(path, "wb") as f:
+        f.write(dumps_binary(ir))
+
+
+def load_binary(path):
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads_binary(mapped)
@@ -1,65 +1,122 @@
 import json
 
+from backend.profiling import span
+
 def flatten(lst):
-    if isinstance(lst, list):
-        result = []
-        for item in lst:
+    # Iterative; for hand-written ASTs whose id_lists are nested. The
+    # parser's are already flat (see _names).
+    if not isinstance(lst, list):
+        return [lst]
+    result = []
+    stack = [iter(lst)]
+    while stack:
+        for item in stack[-1]:
             if isinstance(item, list):
-                result.extend(flatten(item))
-            else:
-                result.append(item)
-        return result
-    return [lst]
+                stack.append(iter(item))
+                break
+            result.append(item)
+        else:
+            stack.pop()
+    return result
+
+def _names(value):
+    # The parser's id_lists are flat lists of names and go into the IR as
+    # they are (the IR shares them with the AST); anything else is flattened
+    if type(value) is list and list not in map(type, value):
+        return value
+    return flatten(value)
+
+def _block(block):
+    # An if branch is a statement list, a single statement or None
+    if isinstance(block, list):
+        return block
+    return [block] if block else []
+
+def _compile_if(stmt, qubits):
+    then_out, else_out = [], []
+    compile_into(_block(stmt["then"]), qubits, then_out)
+    compile_into(_block(stmt.get("else")), qubits, else_out)
+    return {"type": "if", "condition": stmt["condition"], "then": then_out, "else": else_out}
+
+def compile_into(statements, qubits, instructions):
+    # Appends the IR of `statements` to `instructions` and their qubit
+    # declarations to `qubits`. Allocation is what costs here (mostly in the
+    # collector passes it triggers), so each statement makes one dict and
+    # its name lists come from the AST.
+    emit = instructions.append
+    for stmt in statements:
+        stype = stmt["type"]
+        if stype == "QuantumOp":
+            emit({"op": stmt["gate"], "args": _names(stmt["qubits"])})
+        elif stype == "QubitDecl":
+            qubits.extend(_names(stmt["qubits"]))
+        elif stype == "If":
+            emit(_compile_if(stmt, qubits))
+        else:
+            emit(_compile_simple(stmt))
+
+def _compile_simple(stmt):
+    stype = stmt["type"]
+    if stype == "QuantumOp":
+        return {"op": stmt["gate"], "args": _names(stmt["qubits"])}
+    if stype == "Measure":
+        return {"op": "measure", "qubits": _names(stmt["qubits"]), "classical": _names(stmt["classical"])}
+    if stype == "Barrier":
+        return {"op": "barrier", "args": _names(stmt["qubits"])}
+    if stype == "Print":
+        return {"op": "print", "args": _names(stmt["args"])}
+    if stype == "Convert":
+        return {"op": "convert", "value": stmt["value"]}
+    raise ValueError(f"Unknown statement type: {stype}")
 
 def compile_stmt(stmt):
     stype = stmt["type"]
+    if stype == "QuantumOp":
+        return {"op": stmt["gate"], "args": _names(stmt["qubits"])}
     if stype == "QubitDecl":
-        return ("qubits", flatten(stmt["qubits"]))
-    elif stype == "QuantumOp":
-        return {"op": stmt["gate"], "args": flatten(stmt["qubits"])}
-    elif stype == "Barrier":
-        return {"op": "barrier", "args": flatten(stmt["qubits"])}
-    elif stype == "Measure":
-        return {"op": "measure", "qubits": flatten(stmt["qubits"]), "classical": flatten(stmt["classical"])}
-    elif stype == "Print":
-        return {"op": "print", "args": flatten(stmt["args"])}
-    elif stype == "Convert":
-        return {"op": "convert", "value": stmt["value"]}
-    elif stype == "If":
-        then_block = stmt["then"]
-        else_block = stmt.get("else", [])
-        then_stmts = then_block if isinstance(then_block, list) else [then_block]
-        else_stmts = else_block if isinstance(else_block, list) else ([else_block] if else_block else [])
-        return {
-            "type": "if",
-            "condition": stmt["condition"],
-            "then": [compile_stmt(s) for s in then_stmts],
-            "else": [compile_stmt(s) for s in else_stmts]
-        }
-    else:
-        raise ValueError(f"Unknown statement type: {stype}")
+        return ("qubits", _names(stmt["qubits"]))
+    if stype == "If":
+        # Declarations inside a streamed if block have nowhere to go
+        return _compile_if(stmt, [])
+    return _compile_simple(stmt)
 
 def ast_to_ir(ast):
     if ast.get("type") != "Program":
         ast = {"type": "Program", "body": [ast]}
 
     ir = {"type": "Program", "qubits": [], "instructions": []}
+    with span("compile"):
+        compile_into(ast["body"], ir["qubits"], ir["instructions"])
+    return ir
 
-    for stmt in ast["body"]:
-        compiled = compile_stmt(stmt)
-        if isinstance(compiled, tuple) and compiled[0] == "qubits":
-            ir["qubits"].extend(compiled[1])
-        else:
-            ir["instructions"].append(compiled)
+def iter_ir(statements):
+    # Streaming counterpart of ast_to_ir: yields ("qubits", names) for each
+    # declaration and one IR instruction per other statement.
+    for stmt in statements:
+        yield compile_stmt(stmt)
 
-    return ir
+def iter_ir_file(fh):
+    from backend.parser import iter_qucpl
+    return iter_ir(iter_qucpl(fh))
 
-def compile_ast_file(ast_path, ir_path):
+def compile_ast_file(ast_path, ir_path, binary=False, optimize=False, analyze=False):
     with open(ast_path) as f:
         ast = json.load(f)
     ir = ast_to_ir(ast)
-    with open(ir_path, "w") as f:
-        json.dump(ir, f, indent=2)
+    if optimize:
+        from backend.optimizer import optimize_ir
+        ir, report = optimize_ir(ir)
+        print(f"[OPTIMIZER] {report['gates_before']} -> {report['gates_after']} gates "
+              f"({report['cancelled']} cancelled, {report['fused']} fused)")
+    if analyze:
+        from backend.analysis import analyze_ir, format_analysis
+        print(format_analysis(analyze_ir(ir)))
+    if binary:
+        from backend.binary_ir import dump_binary
+        dump_binary(ir, ir_path)
+    else:
+        with open(ir_path, "w") as f:
+            json.dump(ir, f, indent=2)
     print(f"IR saved to {ir_path}")
 
 if __name__ == "__main__":
@@ -67,5 +124,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Compile AST to IR")
     parser.add_argument("ast_file", help="Path to AST JSON file")
     parser.add_argument("output_file", help="Output IR JSON file")
+    parser.add_argument("--binary", action="store_true", help="Write the packed binary IR format instead of JSON")
+    parser.add_argument("--optimize", action="store_true", help="Run the peephole optimizer on the IR")
+    parser.add_argument("--analyze", action="store_true", help="Print circuit depth, layers and critical path")
     args = parser.parse_args()
-    compile_ast_file(args.ast_file, args.output_file)
+    compile_ast_file(args.ast_file, args.output_file, binary=args.binary, optimize=args.optimize, analyze=args.analyze)
@@ -0,0 +1,259 @@
+import numpy as np
+
+from backend.packed import matrix_from_json, matrix_to_json
+from backend.statevector import GATES
+
+# ------------------------
+# Peephole Optimizer
+# ------------------------
+# One forward pass over the JSON IR. Each gate is compared with the earlier
+# gates on its qubits, looking back past gates it commutes with:
+#
+#   cancellation   a self-inverse gate meeting an identical one removes both
+#                  (h h, x x, cx a, b / cx a, b, swap a, b / swap b, a, ...)
+#   fusion         a single-qubit gate meeting another single-qubit gate on
+#                  the same qubit is multiplied into it. A product equal to
+#                  the identity up to global phase removes both, one equal to
+#                  h/x/y/z is written as that gate and anything else becomes a
+#                  {"op": "unitary", "args": [q], "matrix": ...} instruction.
+#
+# Measurements and barriers are never looked past on the qubits they name, and
+# nothing is moved across a convert. The then and else blocks of an if are
+# optimized on their own; gates outside are only moved past the if on qubits
+# neither block touches.
+
+SELF_INVERSE = {"h", "x", "y", "z", "cx", "cy", "cz", "ccx", "swap"}
+SINGLE_QUBIT = {"h", "x", "y", "z", "unitary"}
+FENCE_OPS = {"measure", "barrier"}
+
+# Earlier instructions on a qubit a gate may look back through
+MAX_LOOKBACK = 32
+
+IDENTITY = np.eye(2, dtype=complex)
+
+
+def gate_roles(op, args):
+    # The Pauli basis a gate is diagonal in on each of its qubits ("z", "x" or
+    # "y"), or None where it is not. Two gates whose roles agree on every
+    # qubit they share commute.
+    if op in {"x", "y", "z"}:
+        return {args[0]: op}
+    if op == "cz":
+        return {args[0]: "z", args[1]: "z"}
+    if op in {"cx", "cy", "ccx"}:
+        roles = {c: "z" for c in args[:-1]}
+        roles[args[-1]] = op[-1]
+        return roles
+    return {q: None for q in args}
+
+
+def _commutes(a, b):
+    for q, role in a.items():
+        if q in b and (role is None or b[q] != role):
+            return False
+    return True
+
+
+def _gate_key(op, args):
+    # Identical up to the symmetric operands of cz, swap and ccx's controls
+    if op in {"cz", "swap"}:
+        return op, tuple(sorted(args))
+    if op == "ccx":
+        return op, tuple(sorted(args[:2])) + (args[2],)
+    return op, tuple(args)
+
+
+def _matrix_of(instr):
+    if instr["op"] == "unitary":
+        return matrix_from_json(instr["matrix"])
+    return GATES[instr["op"]]
+
+
+def _same_up_to_phase(a, b):
+    return abs(abs(np.trace(a.conj().T @ b)) - 2) < 1e-9
+
+
+def _fused_instruction(matrix, q):
+    # None when the product is the identity
+    if _same_up_to_phase(matrix, IDENTITY):
+        return None
+    for name, gate in GATES.items():
+        if _same_up_to_phase(matrix, gate):
+            return {"op": name, "args": [q]}
+    return {"op": "unitary", "args": [q], "matrix": matrix_to_json(matrix)}
+
+
+def _is_gate(instr):
+    return instr.get("type") != "if" and instr["op"] not in {"measure", "barrier", "print", "convert"}
+
+
+class _Peephole:
+    def __init__(self, commute=True, cancel=True, fuse=True):
+        self.commute = commute
+        self.cancel = cancel
+        self.fuse = fuse
+        # Output slots are [instr, roles]; removed gates leave None behind
+        self.out = []
+        # Indices into out of the instructions touching each qubit
+        self.history = {}
+        # Nothing before this index may be changed
+        self.fence = 0
+        self.cancelled = 0
+        self.fused = 0
+
+    def push(self, instr, roles):
+        self.out.append([instr, roles])
+        for q in roles:
+            self.history.setdefault(q, []).append(len(self.out) - 1)
+
+    def add(self, instr):
+        if instr.get("type") == "if":
+            self.add_if(instr)
+            return
+        if instr["op"] == "convert":
+            self.out.append([instr, {}])
+            self.fence = len(self.out)
+            return
+        op, args = instr["op"], instr.get("args", [])
+        if op in FENCE_OPS:
+            qubits = instr["qubits"] if op == "measure" else args
+            if not qubits:
+                self.out.append([instr, {}])
+                self.fence = len(self.out)
+            else:
+                self.push(instr, {q: None for q in qubits})
+            return
+        if op == "print":
+            self.out.append([instr, {}])
+            return
+        if len(set(args)) != len(args):
+            self.push(instr, {q: None for q in args})
+            return
+
+        roles = gate_roles(op, args)
+        j = self.partner(args, roles)
+        if j is not None and self.cancel and op in SELF_INVERSE:
+            prev = self.out[j][0]
+            if _gate_key(prev["op"], prev["args"]) == _gate_key(op, args):
+                self.out[j] = None
+                self.cancelled += 2
+                return
+        if j is not None and self.fuse and op in SINGLE_QUBIT and self.out[j][0]["op"] in SINGLE_QUBIT:
+            fused = _fused_instruction(_matrix_of(instr) @ _matrix_of(self.out[j][0]), args[0])
+            if fused is None:
+                self.out[j] = None
+                self.cancelled += 2
+            else:
+                self.out[j] = [fused, gate_roles(fused["op"], fused["args"])]
+                self.fused += 1
+            return
+        self.push(instr, roles)
+
+    def add_if(self, instr):
+        optimized = dict(instr)
+        qubits = set()
+        full_fence = False
+        for key in ("then", "else"):
+            if key not in instr:
+                continue
+            block = _Peephole(commute=self.commute, cancel=self.cancel, fuse=self.fuse)
+            for sub in instr[key]:
+                block.add(sub)
+            optimized[key] = block.instructions()
+            self.cancelled += block.cancelled
+            self.fused += block.fused
+            for slot in block.out:
+                if slot is not None:
+                    qubits.update(slot[1])
+            full_fence = full_fence or block.fence > 0
+        if full_fence:
+            self.out.append([optimized, {}])
+            self.fence = len(self.out)
+        elif qubits:
+            self.push(optimized, {q: None for q in qubits})
+        else:
+            self.out.append([optimized, {}])
+
+    def partner(self, args, roles):
+        # The latest live gate on exactly these qubits that the new gate can
+        # be moved back to, i.e. every gate in between commutes with it
+        qubits = set(args)
+        steps = 0
+        for j in reversed(self.history.get(args[0], [])):
+            if j < self.fence or steps >= MAX_LOOKBACK:
+                return None
+            steps += 1
+            slot = self.out[j]
+            if slot is None:
+                continue
+            if set(slot[1]) == qubits and _is_gate(slot[0]):
+                return j if self.clear_after(j, args[1:], roles) else None
+            if not (self.commute and _commutes(roles, slot[1])):
+                return None
+        return None
+
+    def clear_after(self, j, qubits, roles):
+        for q in qubits:
+            for steps, k in enumerate(reversed(self.history.get(q, []))):
+                if k <= j:
+                    break
+                if steps >= MAX_LOOKBACK:
+                    return False
+                slot = self.out[k]
+                if slot is not None and not (self.commute and _commutes(roles, slot[1])):
+                    return False
+        return True
+
+    def instructions(self):
+        return [slot[0] for slot in self.out if slot is not None]
+
+
+def _count_gates(instructions):
+    # Gates inside if blocks included
+    count = 0
+    for instr in instructions:
+        if instr.get("type") == "if":
+            count += _count_gates(instr.get("then", [])) + _count_gates(instr.get("else", []))
+        elif _is_gate(instr):
+            count += 1
+    return count
+
+
+def optimize_ir(ir, commute=True, cancel=True, fuse=True):
+    # Returns the optimized IR (a new dict; unchanged instructions are shared
+    # with the input) and a report of what was removed.
+    instructions = ir.get("instructions", [])
+    peephole = _Peephole(commute=commute, cancel=cancel, fuse=fuse)
+    for instr in instructions:
+        peephole.add(instr)
+    optimized = peephole.instructions()
+
+    before = _count_gates(instructions)
+    after = _count_gates(optimized)
+    report = {
+        "gates_before": before,
+        "gates_after": after,
+        "removed": before - after,
+        "cancelled": peephole.cancelled,
+        "fused": peephole.fused,
+    }
+    return {"type": "Program", "qubits": list(ir.get("qubits", [])), "instructions": optimized}, report
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Peephole-optimize IR JSON")
+    parser.add_argument("ir_file", help="Path to IR JSON file")
+    parser.add_argument("output_file", help="Output IR JSON file")
+    parser.add_argument("--no-commute", action="store_true", help="Only combine directly adjacent gates")
+    args = parser.parse_args()
+
+    with open(args.ir_file) as f:
+        ir = json.load(f)
+    optimized, report = optimize_ir(ir, commute=not args.no_commute)
+    with open(args.output_file, "w") as f:
+        json.dump(optimized, f, indent=2)
+    print(f"[OPTIMIZER] {report['gates_before']} -> {report['gates_after']} gates "
+          f"({report['cancelled']} cancelled, {report['fused']} fused)")
+    print(f"Optimized IR saved to {args.output_file}")
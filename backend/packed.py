@@ -0,0 +1,269 @@
+from enum import IntEnum
+from functools import cached_property
+
+import numpy as np
+
+# ------------------------
+# Packed (array-backed) IR
+# ------------------------
+# The JSON IR is a list of per-instruction dicts with string operands. The
+# packed form keeps one opcode per instruction in an int8 array and all
+# operands in a single int32 array indexed by per-instruction offsets:
+#
+#   gates, barrier   qubit ids
+#   measure          qubit ids followed by the same number of name ids
+#   print            name ids
+#   convert          constant id
+#   if               name id of the condition bit, constant id of the value,
+#                    then length, else length (in packed instructions; the
+#                    blocks follow the if instruction directly)
+#   unitary          qubit id, index into `matrices` (complex, shape (k, 2, 2))
+#
+# Qubit ids index `qubits`; name ids index `names`, which starts with the
+# qubits so a qubit's name id equals its qubit id.
+
+
+class Opcode(IntEnum):
+    H = 0
+    X = 1
+    Y = 2
+    Z = 3
+    CX = 4
+    CY = 5
+    CZ = 6
+    CCX = 7
+    SWAP = 8
+    BARRIER = 9
+    MEASURE = 10
+    PRINT = 11
+    CONVERT = 12
+    IF = 13
+    UNITARY = 14
+
+
+OPCODES = {op.name.lower(): op for op in Opcode}
+GATE_OPCODES = {Opcode.H, Opcode.X, Opcode.Y, Opcode.Z, Opcode.CX, Opcode.CY, Opcode.CZ, Opcode.CCX, Opcode.SWAP}
+
+
+def matrix_to_json(matrix):
+    # A "unitary" op's 2x2 matrix as nested [re, im] pairs
+    return [[[float(v.real), float(v.imag)] for v in row] for row in np.asarray(matrix, dtype=complex)]
+
+
+def matrix_from_json(data):
+    return np.array([[complex(re, im) for re, im in row] for row in data], dtype=complex)
+
+
+class PackedIR:
+    def __init__(self, qubits, names, constants, opcodes, offsets, operands, matrices=None):
+        self.qubits = qubits
+        self.names = names
+        self.constants = constants
+        self.opcodes = opcodes
+        self.offsets = offsets
+        self.operands = operands
+        self.matrices = np.zeros((0, 2, 2), dtype=complex) if matrices is None else matrices
+
+    # Plain-int views for interpreters; indexing Python lists is much faster
+    # than pulling scalars out of NumPy arrays one at a time. They are built
+    # on first use so a memory-mapped IR is not copied until it is run.
+    @cached_property
+    def opcode_list(self):
+        return self.opcodes.tolist()
+
+    @cached_property
+    def offset_list(self):
+        return self.offsets.tolist()
+
+    @cached_property
+    def operand_list(self):
+        return self.operands.tolist()
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def operands_of(self, i):
+        return self.operands[self.offsets[i]:self.offsets[i + 1]]
+
+    def nbytes(self):
+        return self.opcodes.nbytes + self.offsets.nbytes + self.operands.nbytes + self.matrices.nbytes
+
+    def unpack_instruction(self, i):
+        # The JSON form of instruction i (an if includes its blocks)
+        stop = i + 1
+        if self.opcode_list[i] == Opcode.IF:
+            stop += sum(self.operand_list[self.offset_list[i] + 2:self.offset_list[i] + 4])
+        return _unpack_range(self, i, stop)[0]
+
+    def convert_value(self):
+        # The value of a leading convert instruction, or None
+        if len(self) and self.opcode_list[0] == Opcode.CONVERT:
+            return self.constants[self.operand_list[self.offset_list[0]]]
+        return None
+
+    def gate_counts(self):
+        # Same totals as backend.simulator.count_gates on the JSON form
+        counts = {}
+        for opcode in self.opcode_list:
+            if opcode != Opcode.IF:
+                name = Opcode(opcode).name.lower()
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def classical_bits(self):
+        # Same names as backend.statevector.classical_bits_of on the JSON form
+        bits = set()
+        for i, opcode in enumerate(self.opcode_list):
+            args = self.operand_list[self.offset_list[i]:self.offset_list[i + 1]]
+            if opcode == Opcode.MEASURE:
+                bits.update(self.names[a] for a in args[len(args) // 2:])
+            elif opcode == Opcode.IF:
+                bits.add(self.names[args[0]])
+        return sorted(bits)
+
+    def is_terminal_measurement(self):
+        # Packed counterpart of backend.statevector.is_terminal_measurement
+        measured = set()
+        i = 0
+        while i < len(self.opcode_list):
+            opcode = self.opcode_list[i]
+            args = self.operand_list[self.offset_list[i]:self.offset_list[i + 1]]
+            i += 1
+            if opcode == Opcode.IF:
+                block = self.opcode_list[i:i + args[2] + args[3]]
+                if any(op not in (Opcode.PRINT, Opcode.BARRIER) for op in block):
+                    return False
+                i += args[2] + args[3]
+            elif opcode == Opcode.MEASURE:
+                measured.update(args[:len(args) // 2])
+            elif opcode in GATE_OPCODES and measured.intersection(args):
+                return False
+            elif opcode == Opcode.UNITARY and args[0] in measured:
+                return False
+        return True
+
+
+class _Packer:
+    def __init__(self, qubits):
+        self.qubits = list(qubits)
+        self.names = list(self.qubits)
+        self.name_ids = {n: i for i, n in enumerate(self.names)}
+        self.constants = []
+        self.matrices = []
+        self.opcodes = []
+        self.offsets = [0]
+        self.operands = []
+
+    def name_id(self, name):
+        if name not in self.name_ids:
+            self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return self.name_ids[name]
+
+    def qubit_id(self, name):
+        qubit = self.name_ids.get(name)
+        if qubit is None or qubit >= len(self.qubits):
+            raise ValueError(f"Unknown qubit '{name}'")
+        return qubit
+
+    def constant_id(self, value):
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+    def emit(self, opcode, operands):
+        self.opcodes.append(opcode)
+        self.operands.extend(operands)
+        self.offsets.append(len(self.operands))
+        return len(self.opcodes) - 1
+
+    def pack(self, instructions):
+        # Returns how many packed instructions were emitted, nested ones included
+        start = len(self.opcodes)
+        for instr in instructions:
+            if instr.get("type") == "if":
+                cond = instr["condition"]
+                index = self.emit(Opcode.IF, [self.name_id(cond["var"]), self.constant_id(cond["value"]), 0, 0])
+                then_len = self.pack(instr.get("then", []))
+                else_len = self.pack(instr.get("else", []))
+                self.operands[self.offsets[index] + 2] = then_len
+                self.operands[self.offsets[index] + 3] = else_len
+                continue
+
+            op = instr["op"]
+            if op not in OPCODES:
+                raise ValueError(f"Cannot pack unknown op '{op}'")
+            opcode = OPCODES[op]
+            if opcode == Opcode.MEASURE:
+                operands = [self.qubit_id(q) for q in instr["qubits"]] + [self.name_id(c) for c in instr["classical"]]
+            elif opcode == Opcode.PRINT:
+                operands = [self.name_id(a) for a in instr.get("args", [])]
+            elif opcode == Opcode.CONVERT:
+                operands = [self.constant_id(instr["value"])]
+            elif opcode == Opcode.UNITARY:
+                self.matrices.append(matrix_from_json(instr["matrix"]))
+                operands = [self.qubit_id(instr["args"][0]), len(self.matrices) - 1]
+            else:
+                operands = [self.qubit_id(q) for q in instr.get("args", [])]
+            self.emit(opcode, operands)
+        return len(self.opcodes) - start
+
+    def result(self):
+        return PackedIR(
+            self.qubits,
+            self.names,
+            self.constants,
+            np.array(self.opcodes, dtype=np.int8),
+            np.array(self.offsets, dtype=np.int32),
+            np.array(self.operands, dtype=np.int32),
+            np.array(self.matrices, dtype=complex).reshape(-1, 2, 2),
+        )
+
+
+def pack_ir(ir):
+    packer = _Packer(ir.get("qubits", []))
+    packer.pack(ir.get("instructions", []))
+    return packer.result()
+
+
+def _unpack_range(packed, start, stop):
+    instructions = []
+    i = start
+    while i < stop:
+        opcode = Opcode(int(packed.opcodes[i]))
+        operands = [int(x) for x in packed.operands_of(i)]
+        i += 1
+        if opcode == Opcode.IF:
+            var, value, then_len, else_len = operands
+            instructions.append({
+                "type": "if",
+                "condition": {"type": "Condition", "var": packed.names[var], "value": packed.constants[value]},
+                "then": _unpack_range(packed, i, i + then_len),
+                "else": _unpack_range(packed, i + then_len, i + then_len + else_len),
+            })
+            i += then_len + else_len
+        elif opcode == Opcode.MEASURE:
+            half = len(operands) // 2
+            instructions.append({
+                "op": "measure",
+                "qubits": [packed.names[q] for q in operands[:half]],
+                "classical": [packed.names[c] for c in operands[half:]],
+            })
+        elif opcode == Opcode.CONVERT:
+            instructions.append({"op": "convert", "value": packed.constants[operands[0]]})
+        elif opcode == Opcode.UNITARY:
+            instructions.append({
+                "op": "unitary",
+                "args": [packed.names[operands[0]]],
+                "matrix": matrix_to_json(packed.matrices[operands[1]]),
+            })
+        else:
+            instructions.append({"op": opcode.name.lower(), "args": [packed.names[a] for a in operands]})
+    return instructions
+
+
+def unpack_ir(packed):
+    return {
+        "type": "Program",
+        "qubits": list(packed.qubits),
+        "instructions": _unpack_range(packed, 0, len(packed)),
+    }
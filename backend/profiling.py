@@ -0,0 +1,112 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# ------------------------
+# Stage Timing
+# ------------------------
+# `span(stage)` times a block. Every span is added to the process-wide totals
+# exported by prometheus_text(), and to the innermost active `collect()`
+# profile, if any, so a request or IDE action can report its own breakdown.
+# Spans nest freely; an outer stage's time includes its inner stages.
+
+_current = contextvars.ContextVar("quickide_profile", default=None)
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+class Profile:
+    def __init__(self):
+        self.spans = []
+        self.started = time.perf_counter()
+
+    def add(self, stage, seconds):
+        self.spans.append((stage, seconds))
+
+    def timings(self):
+        # Seconds per stage, summed over repeats, in first-seen order
+        totals = {}
+        for stage, seconds in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+
+def record(stage, seconds, aggregate=True):
+    if aggregate:
+        with _metrics_lock:
+            entry = _metrics.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+    profile = _current.get()
+    if profile is not None:
+        profile.add(stage, seconds)
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def start_profile():
+    # For code that cannot wrap the work in collect(), e.g. request hooks
+    profile = Profile()
+    return profile, _current.set(profile)
+
+
+def stop_profile(token):
+    _current.reset(token)
+
+
+@contextmanager
+def collect():
+    profile, token = start_profile()
+    try:
+        yield profile
+    finally:
+        stop_profile(token)
+
+
+def format_timings(timings):
+    return ", ".join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in timings.items())
+
+
+def server_timing_header(timings):
+    # Value for an HTTP Server-Timing header (durations in milliseconds)
+    return ", ".join(f"{stage.replace('.', '-')};dur={seconds * 1000:.3f}" for stage, seconds in timings.items())
+
+
+def metrics_snapshot():
+    with _metrics_lock:
+        return {stage: {"count": c, "seconds": s, "max_seconds": m} for stage, (c, s, m) in _metrics.items()}
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def prometheus_text():
+    # Prometheus text exposition format (version 0.0.4)
+    lines = [
+        "# HELP quickide_stage_seconds Time spent in each pipeline stage.",
+        "# TYPE quickide_stage_seconds summary",
+    ]
+    snapshot = metrics_snapshot()
+    for stage, m in sorted(snapshot.items()):
+        lines.append(f'quickide_stage_seconds_count{{stage="{stage}"}} {m["count"]}')
+        lines.append(f'quickide_stage_seconds_sum{{stage="{stage}"}} {m["seconds"]:.9f}')
+    lines.append("# HELP quickide_stage_seconds_max Longest single run of each pipeline stage.")
+    lines.append("# TYPE quickide_stage_seconds_max gauge")
+    for stage, m in sorted(snapshot.items()):
+        lines.append(f'quickide_stage_seconds_max{{stage="{stage}"}} {m["max_seconds"]:.9f}')
+    return "\n".join(lines) + "\n"
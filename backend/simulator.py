@@ -2,61 +2,108 @@ import json
 import matplotlib.pyplot as plt
 from qiskit import QuantumCircuit, transpile
 from qiskit_aer import Aer
-from qiskit.visualization import plot_histogram, plot_bloch_multivector
-from qiskit.quantum_info import Statevector
-import matplotlib.pyplot as plt
+from qiskit.visualization import plot_histogram
 import io
+import itertools
+import os
+import time
+
+from backend.binary_ir import is_binary_ir, load_binary
+from backend.cache import LRUCache, content_hash, ir_hash
+from backend.optimizer import optimize_ir
+from backend.packed import OPCODES, Opcode, PackedIR, matrix_from_json, unpack_ir
+from backend.profiling import span
+from backend.sparse import exact_sparse, run_sparse
+from backend.statevector import (
+    classical_bits_of,
+    exact_statevector,
+    is_terminal_measurement,
+    run_statevector,
+    run_statevector_stream,
+)
+
+
+def convert_state(value):
+    # The basis state `convert` prepares, in closed form: qubit i holds bit i
+    # of value, so the state is |value> and each qubit sits at a Bloch pole
+    if value < 0:
+        raise ValueError(f"convert needs a non-negative integer, got {value}")
+    bitstring = bin(value)[2:]
+    return {
+        "value": value,
+        "bitstring": bitstring,
+        "index": value,
+        "num_qubits": len(bitstring),
+        "bloch": [[0.0, 0.0, -1.0 if bit == "1" else 1.0] for bit in reversed(bitstring)],
+    }
+
+
+def format_convert(state):
+    lines = [f"Decimal {state['value']} → Binary {state['bitstring']} (basis state index {state['index']})"]
+    for i, (_, _, z) in enumerate(state["bloch"]):
+        lines.append(f"Initializing q[{i}] to |{0 if z > 0 else 1}⟩")
+    return "\n".join(lines)
 
 
 def simulate_convert(value: int):
     print("\n--- Convert Command ---")
-    binary_str = bin(value)[2:]
-    num_bits = len(binary_str)
-    print(f"Decimal {value} → Binary {binary_str}")
-
-    qc = QuantumCircuit(num_bits, num_bits)
-    for i, bit in enumerate(reversed(binary_str)):
-        if bit == '1':
-            qc.x(i)
-            print(f"Initializing q[{i}] to |1⟩")
-        else:
-            print(f"Initializing q[{i}] to |0⟩")
+    state = convert_state(value)
+    print(format_convert(state))
+    return state
 
-    sv = Statevector.from_instruction(qc)
-    print("\n[STATEVECTOR]")
-    print(sv)
 
-    try:
-        plot_bloch_multivector(sv)
-        plt.title("Bloch Spheres of Converted State")
-        plt.show()
-    except Exception as e:
-        print(f"[BLOCH ERROR] {e}")
+def _convert_value(ir):
+    # The value of a leading convert instruction, or None
+    if isinstance(ir, PackedIR):
+        return ir.convert_value()
+    instructions = ir.get("instructions", [])
+    if instructions and instructions[0].get("op") == "convert":
+        return instructions[0]["value"]
+    return None
 
 
-def build_qiskit_circuit(ir):
-    qubits = ir.get("qubits", [])
-    instructions = ir.get("instructions", [])
+def _is_convert(ir):
+    return _convert_value(ir) is not None
 
-    if instructions and instructions[0].get("op") == "convert":
-        simulate_convert(instructions[0]["value"])
-        return None, []
 
-    classical_bits = set()
-    for instr in instructions:
-        if instr.get("op") == "measure":
-            classical_bits.update(instr.get("classical", []))
-        elif instr.get("type") == "if":
-            classical_bits.add(instr["condition"]["var"])
+_aer_backends = {}
+
+
+def get_aer_backend(method=None):
+    # One simulator instance per method and process, created on first use.
+    # Method-specific backends carry their own limits (the default target
+    # stops at ~28 qubits, the stabilizer one at 10000).
+    if method not in _aer_backends:
+        _aer_backends[method] = Aer.get_backend('aer_simulator' if method is None else f'aer_simulator_{method}')
+    return _aer_backends[method]
 
-    classical_bits = sorted(classical_bits)
+
+# Built and transpiled circuits keyed by IR content hash
+_circuit_cache = LRUCache(maxsize=64)
+
+
+def _build_circuit(ir):
+    qubits = ir.get("qubits", [])
+    instructions = ir.get("instructions", [])
+
+    classical_bits = classical_bits_of(instructions)
     qmap = {q: i for i, q in enumerate(qubits)}
     cmap = {c: i for i, c in enumerate(classical_bits)}
 
     qc = QuantumCircuit(len(qubits), len(classical_bits))
     gate_counts = {}
+    # Side effects (print/convert output, build errors) are recorded so they
+    # can be replayed whenever the cached circuit is reused. Prints inside if
+    # blocks depend on the run, so the circuit cannot replay them.
+    log = []
+    depth = 0
+
+    def apply_block(block):
+        for instr in block:
+            apply_instruction(instr)
 
     def apply_instruction(instr):
+        nonlocal depth
         if "op" in instr:
             op = instr["op"]
             args = instr.get("args", [])
@@ -67,87 +114,679 @@ def build_qiskit_circuit(ir):
                     getattr(qc, op)(qmap[args[0]], qmap[args[1]])
                 elif op == "ccx":
                     qc.ccx(qmap[args[0]], qmap[args[1]], qmap[args[2]])
+                elif op == "unitary":
+                    qc.unitary(matrix_from_json(instr["matrix"]), [qmap[args[0]]], label="fused")
                 elif op == "barrier":
                     qc.barrier(*[qmap[q] for q in args])
                 elif op == "measure":
                     for q, c in zip(instr["qubits"], instr["classical"]):
                         qc.measure(qmap[q], cmap[c])
-                elif op == "print":
-                    print(f"[PRINT] {', '.join(args)}")
+                elif op == "print" and depth == 0:
+                    log.append(("text", f"[PRINT] {', '.join(args)}"))
                 elif op == "convert":
-                    simulate_convert(instr["value"])
+                    log.append(("convert", instr["value"]))
                 gate_counts[op] = gate_counts.get(op, 0) + 1
             except Exception as e:
-                print(f"[ERROR] Failed to apply {instr}: {e}")
+                log.append(("error", f"[ERROR] Failed to apply {instr}: {e}"))
         elif instr.get("type") == "if":
+            # The whole then/else pair becomes a single conditional, so Aer
+            # branches once per if rather than once per gate
             cond = instr["condition"]
-            var = cond["var"]
-            val = cond["value"]
-            c_idx = cmap[var]
-            for sub in instr.get("then", []):
-                op = sub.get("op")
-                args = sub.get("args", [])
-                try:
-                    if op == "x":
-                        with qc.if_test((c_idx, val)):
-                            qc.x(qmap[args[0]])
-                    elif op == "z":
-                        with qc.if_test((c_idx, val)):
-                            qc.z(qmap[args[0]])
-                    gate_counts[op] = gate_counts.get(op, 0) + 1
-                except Exception as e:
-                    print(f"[ERROR in conditional]: {e}")
+            then_block, else_block = instr.get("then", []), instr.get("else", [])
+            depth += 1
+            try:
+                if cond["value"] not in (0, 1):
+                    # A single bit never equals it
+                    apply_block(else_block)
+                else:
+                    with qc.if_test((cmap[cond["var"]], cond["value"])) as else_:
+                        apply_block(then_block)
+                    if else_block:
+                        with else_:
+                            apply_block(else_block)
+            except Exception as e:
+                log.append(("error", f"[ERROR in conditional]: {e}"))
+            finally:
+                depth -= 1
 
     for instr in instructions:
         apply_instruction(instr)
 
+    return {
+        "circuit": qc,
+        "classical_bits": classical_bits,
+        "gate_counts": gate_counts,
+        "log": log,
+        "feedback": any(instr.get("type") == "if" for instr in instructions),
+        "transpiled": {},
+    }
+
+
+def compile_circuit(ir):
+    key = ir_hash(ir)
+    entry = _circuit_cache.get(key)
+    if entry is None:
+        with span("build_circuit"):
+            entry = _build_circuit(ir)
+        _circuit_cache.put(key, entry)
+    return entry
+
+
+def _runs_untranspiled(entry, sim):
+    # Aer runs every gate the IR produces natively. The MPS target's coupling
+    # map stops at 63 qubits but the method itself doesn't, and transpiling
+    # if_else blocks costs far more than running a feedback circuit
+    return sim.name == "aer_simulator_matrix_product_state" or entry["feedback"]
+
+
+def _transpile_level(sim):
+    # Level 2 resynthesizes 1q runs into rz/sx, which the stabilizer method
+    # rejects as non-Clifford parameters
+    return 1 if sim.name == "aer_simulator_stabilizer" else None
+
+
+def transpile_cached(entry, sim):
+    if _runs_untranspiled(entry, sim):
+        return entry["circuit"]
+    transpiled = entry["transpiled"].get(sim.name)
+    if transpiled is None:
+        with span("transpile"):
+            transpiled = transpile(entry["circuit"], sim, optimization_level=_transpile_level(sim))
+        entry["transpiled"][sim.name] = transpiled
+    return transpiled
+
+
+def circuit_cache_info():
+    return _circuit_cache.info()
+
+
+def clear_circuit_cache():
+    _circuit_cache.clear()
+
+
+def _replay_build_log(entry):
+    for kind, payload in entry["log"]:
+        if kind == "convert":
+            simulate_convert(payload)
+        else:
+            print(payload)
+
     print("\n[GATE COUNTS]")
-    for g, count in gate_counts.items():
+    for g, count in entry["gate_counts"].items():
         print(f"{g}: {count}")
 
-    return qc, classical_bits
 
-def simulate(ir, title="Quantum Simulation"):
-    result = build_qiskit_circuit(ir)
-    if result is None or result[0] is None:
-        print("[INFO] No circuit to simulate (likely 'convert' instruction handled).")
+def build_qiskit_circuit(ir):
+    if _is_convert(ir):
+        simulate_convert(_convert_value(ir))
+        return None, []
+
+    entry = compile_circuit(ir)
+    _replay_build_log(entry)
+    return entry["circuit"], entry["classical_bits"]
+
+def _run_aer(ir, shots, method=None, **run_options):
+    entry = compile_circuit(ir)
+    _replay_build_log(entry)
+    sim = get_aer_backend(method)
+    circuit = transpile_cached(entry, sim)
+    with span("aer_run"):
+        result = sim.run(circuit, shots=shots, **run_options).result()
+    metadata = result.results[0].metadata if result.results else {}
+    return {
+        "counts": result.get_counts(),
+        "backend": sim.name,
+        "time_taken": result.time_taken,
+        "metadata": {"method": metadata.get("method")},
+    }
+
+
+def _run_numpy(ir, shots):
+    start = time.perf_counter()
+    with span("numpy_run"):
+        counts = run_statevector(ir, shots=shots)
+    return {
+        "counts": counts,
+        "backend": "numpy_statevector",
+        "time_taken": time.perf_counter() - start,
+        "metadata": {"method": "statevector"},
+    }
+
+
+def _run_sparse(ir, shots):
+    start = time.perf_counter()
+    with span("sparse_run"):
+        counts = run_sparse(ir, shots=shots)
+    return {
+        "counts": counts,
+        "backend": "sparse_statevector",
+        "time_taken": time.perf_counter() - start,
+        "metadata": {"method": "sparse"},
+    }
+
+
+def _run_exact(ir, marginals=(), threshold=0.0, sparse=False):
+    # Exact outcome probabilities instead of shots (NumPy or sparse engine)
+    start = time.perf_counter()
+    with span("sparse_run" if sparse else "numpy_run"):
+        run = exact_sparse if sparse else exact_statevector
+        result = run(ir, marginals=marginals, threshold=threshold)
+    result.update({
+        "backend": "sparse_statevector" if sparse else "numpy_statevector",
+        "time_taken": time.perf_counter() - start,
+        "metadata": {"method": "sparse" if sparse else "statevector", "threshold": threshold},
+    })
+    return result
+
+
+def _run_stabilizer(ir, shots):
+    # Clifford circuits on Aer's tableau simulator: polynomial in the qubit
+    # count, so registers far beyond statevector reach are fine
+    return _run_aer(ir, shots, method="stabilizer")
+
+
+def _run_mps(ir, shots, max_bond_dimension=None):
+    # Matrix product state: cost grows with the bond dimension rather than
+    # the register, so wide circuits with little entanglement stay cheap.
+    # Bonds beyond max_bond_dimension are truncated (approximate results).
+    bond = max_bond_dimension or MPS_MAX_BOND_DIMENSION
+    result = _run_aer(ir, shots, method="matrix_product_state", matrix_product_state_max_bond_dimension=bond)
+    if result is not None:
+        result["metadata"]["max_bond_dimension"] = bond
+    return result
+
+
+BACKENDS = {
+    "aer": _run_aer,
+    "mps": _run_mps,
+    "numpy": _run_numpy,
+    "sparse": _run_sparse,
+    "stabilizer": _run_stabilizer,
+}
+
+# "counts" samples shots; "exact" returns outcome probabilities
+MODES = {"counts", "exact"}
+# Exact-mode outcomes at or below this probability are left out
+EXACT_THRESHOLD = 1e-12
+
+# Largest register the automatic selection hands to the dense NumPy engine
+AUTO_NUMPY_MAX_QUBITS = 20
+# Feedback circuits go to the NumPy engine's branching while qubits plus
+# feedback measurements stay under this: its work grows as 2**(sum), while
+# Aer re-runs the circuit per shot at a roughly flat cost
+AUTO_FEEDBACK_MAX_LOG2_WORK = 16
+# Wider circuits with at most this many h/unitary gates go to the sparse
+# engine: each can at most double the number of nonzero amplitudes
+AUTO_SPARSE_MAX_BRANCHING = 12
+# Widest circuit the dense Aer statevector target accepts
+AER_DENSE_MAX_QUBITS = 28
+# Bond dimension cap for the MPS method; automatic selection picks MPS when
+# the estimated bond dimension fits under it
+MPS_MAX_BOND_DIMENSION = int(os.environ.get("QUICKIDE_MPS_MAX_BOND_DIMENSION", 64))
+
+CLIFFORD_OPS = {"h", "x", "y", "z", "cx", "cy", "cz", "swap", "measure", "barrier", "print", "convert"}
+CLIFFORD_OPCODES = {OPCODES[op] for op in CLIFFORD_OPS} | {Opcode.IF}
+
+
+def is_clifford(ir):
+    # Every gate, including those inside if blocks, is a Clifford gate
+    if isinstance(ir, PackedIR):
+        return all(opcode in CLIFFORD_OPCODES for opcode in ir.opcode_list)
+    stack = list(ir.get("instructions", []))
+    while stack:
+        instr = stack.pop()
+        if instr.get("type") == "if":
+            stack.extend(instr.get("then", []))
+            stack.extend(instr.get("else", []))
+        elif instr["op"] not in CLIFFORD_OPS:
+            return False
+    return True
+
+
+# Gates that can put a basis state into superposition; the rest permute or
+# phase basis states
+BRANCHING_OPS = {"h", "unitary"}
+BRANCHING_OPCODES = {OPCODES[op] for op in BRANCHING_OPS}
+
+
+def branching_gates(ir):
+    # How many gates, if blocks included, can grow the number of nonzero amplitudes
+    if isinstance(ir, PackedIR):
+        return sum(1 for opcode in ir.opcode_list if opcode in BRANCHING_OPCODES)
+    count = 0
+    stack = list(ir.get("instructions", []))
+    while stack:
+        instr = stack.pop()
+        if instr.get("type") == "if":
+            stack.extend(instr.get("then", []))
+            stack.extend(instr.get("else", []))
+        elif instr["op"] in BRANCHING_OPS:
+            count += 1
+    return count
+
+
+def feedback_measurements(ir):
+    # Measurements whose classical bit some if reads: each can split the
+    # NumPy engine's state into one branch per outcome
+    read, measured = set(), []
+    if isinstance(ir, PackedIR):
+        offsets, operands = ir.offset_list, ir.operand_list
+        for i, opcode in enumerate(ir.opcode_list):
+            args = operands[offsets[i]:offsets[i + 1]]
+            if opcode == Opcode.IF:
+                read.add(ir.names[args[0]])
+            elif opcode == Opcode.MEASURE:
+                measured.extend(ir.names[c] for c in args[len(args) // 2:])
+        return sum(1 for c in measured if c in read)
+    stack = list(ir.get("instructions", []))
+    while stack:
+        instr = stack.pop()
+        if instr.get("type") == "if":
+            read.add(instr["condition"]["var"])
+            stack.extend(instr.get("then", []))
+            stack.extend(instr.get("else", []))
+        elif instr["op"] == "measure":
+            measured.extend(instr["classical"])
+    return sum(1 for c in measured if c in read)
+
+
+# log2 of each multi-qubit gate's operator Schmidt rank across a cut: the
+# most one application can multiply the bond dimension there by
+ENTANGLING_BITS = {"cx": 1, "cy": 1, "cz": 1, "ccx": 1, "swap": 2}
+ENTANGLING_OPCODES = {OPCODES[op]: bits for op, bits in ENTANGLING_BITS.items()}
+
+
+def _entangling_gates(ir):
+    # (qubit indices, bits) for every multi-qubit gate, if blocks included
+    if isinstance(ir, PackedIR):
+        offsets, operands = ir.offset_list, ir.operand_list
+        for i, opcode in enumerate(ir.opcode_list):
+            if opcode in ENTANGLING_OPCODES:
+                yield operands[offsets[i]:offsets[i + 1]], ENTANGLING_OPCODES[opcode]
         return
+    qmap = {q: i for i, q in enumerate(ir.get("qubits", []))}
+    stack = list(ir.get("instructions", []))[::-1]
+    while stack:
+        instr = stack.pop()
+        if instr.get("type") == "if":
+            stack.extend(reversed(instr.get("else", [])))
+            stack.extend(reversed(instr.get("then", [])))
+        elif instr["op"] in ENTANGLING_BITS:
+            yield [qmap[q] for q in instr["args"]], ENTANGLING_BITS[instr["op"]]
+
+
+def entanglement_profile(ir):
+    # Two-qubit gate graph over the circuit's qubit order. An exact MPS needs
+    # at most 2**k bonds at a cut, k being the entangling bits of the gates
+    # that span it (and no more than the smaller side's qubit count).
+    num_qubits = len(ir.qubits) if isinstance(ir, PackedIR) else len(ir.get("qubits", []))
+    spans = [0] * (num_qubits + 1)
+    edges = set()
+    max_span = 0
+    for qubits, bits in _entangling_gates(ir):
+        lo, hi = min(qubits), max(qubits)
+        spans[lo] += bits
+        spans[hi] -= bits
+        max_span = max(max_span, hi - lo)
+        edges.update((a, b) for a in qubits for b in qubits if a < b)
 
-    qc, classical_bits = result
-    sim = Aer.get_backend('aer_simulator')
+    log_bond, crossing = 0, 0
+    for cut in range(num_qubits - 1):
+        crossing += spans[cut]
+        log_bond = max(log_bond, min(crossing, cut + 1, num_qubits - cut - 1))
+    return {
+        "num_qubits": num_qubits,
+        "edges": len(edges),
+        "max_span": max_span,
+        "log2_bond_dimension": log_bond,
+    }
+
+
+def choose_backend(ir, max_bond_dimension=None):
+    # The backend "auto" resolves to, with the reason for the report
+    bond = max_bond_dimension or MPS_MAX_BOND_DIMENSION
+    if isinstance(ir, PackedIR):
+        num_qubits, terminal = len(ir.qubits), ir.is_terminal_measurement()
+    else:
+        num_qubits, terminal = len(ir.get("qubits", [])), is_terminal_measurement(ir.get("instructions", []))
+    # Measure-at-end circuits are sampled from one statevector evolution,
+    # which makes the shot count essentially free.
+    if num_qubits <= AUTO_NUMPY_MAX_QUBITS and terminal:
+        return {"backend": "numpy", "reason": f"{num_qubits} qubits measured only at the end"}
+    if not terminal:
+        feedback = feedback_measurements(ir)
+        if num_qubits + feedback <= AUTO_FEEDBACK_MAX_LOG2_WORK:
+            return {"backend": "numpy",
+                    "reason": f"{num_qubits} qubits with {feedback} feedback measurements, "
+                              "branched on the statevector engine"}
+    if num_qubits > AUTO_NUMPY_MAX_QUBITS:
+        branching = branching_gates(ir)
+        if branching <= AUTO_SPARSE_MAX_BRANCHING:
+            return {"backend": "sparse",
+                    "reason": f"{branching} h/unitary gates: at most {1 << branching} nonzero amplitudes"}
+    if is_clifford(ir):
+        return {"backend": "stabilizer", "reason": "Clifford-only circuit"}
+    if num_qubits <= AUTO_NUMPY_MAX_QUBITS:
+        return {"backend": "aer", "reason": f"{num_qubits} qubits fit a dense statevector"}
+
+    profile = entanglement_profile(ir)
+    estimate = 1 << profile["log2_bond_dimension"]
+    if estimate <= bond:
+        return {"backend": "mps", "entanglement": profile,
+                "reason": f"two-qubit gates need a bond dimension of at most {estimate} (cap {bond})"}
+    if num_qubits > AER_DENSE_MAX_QUBITS:
+        return {"backend": "mps", "entanglement": profile,
+                "reason": f"{num_qubits} qubits is too wide for a dense statevector; "
+                          f"bond dimension truncated at {bond}, results are approximate"}
+    return {"backend": "aer", "entanglement": profile,
+            "reason": f"estimated bond dimension 2^{profile['log2_bond_dimension']} exceeds the cap of {bond}"}
+
+
+def select_backend(ir):
+    return choose_backend(ir)["backend"]
+
+
+def count_gates(instructions, counts=None):
+    counts = {} if counts is None else counts
+    for instr in instructions:
+        if instr.get("type") == "if":
+            count_gates(instr.get("then", []), counts)
+            count_gates(instr.get("else", []), counts)
+        else:
+            counts[instr["op"]] = counts.get(instr["op"], 0) + 1
+    return counts
+
+
+def _convert_result(value, title, mode):
+    # A convert program prepares |value>; its outcome is certain, so it is
+    # reported as a probability whatever the mode
+    start = time.perf_counter()
+    state = simulate_convert(value)
+    elapsed = time.perf_counter() - start
+    return {
+        "convert": state,
+        "probabilities": {state["bitstring"]: 1.0},
+        "backend": "basis_state",
+        "time_taken": elapsed,
+        "metadata": {"method": "basis_state"},
+        "title": title,
+        "shots": None,
+        "mode": mode,
+        "num_qubits": state["num_qubits"],
+        "gate_counts": {"convert": 1},
+        "wall_time": elapsed,
+        "selection": {"backend": "basis_state", "reason": "convert prepares a known basis state"},
+    }
+
+
+def simulate(ir, title="Quantum Simulation", backend="auto", shots=1024, optimize=True, max_bond_dimension=None,
+             mode="counts", marginals=None, threshold=EXACT_THRESHOLD):
+    if mode not in MODES:
+        raise ValueError(f"Unknown simulation mode '{mode}'. Choose from: {', '.join(sorted(MODES))}")
+    value = _convert_value(ir)
+    if value is not None:
+        return _convert_result(value, title, mode)
+    if mode == "exact":
+        if backend not in {"auto", "numpy", "sparse"}:
+            raise ValueError("Exact mode runs on a statevector engine; use backend 'auto', 'numpy' or 'sparse'")
+        if backend == "auto":
+            backend = "sparse" if choose_backend(ir)["backend"] == "sparse" else "numpy"
+        selection = {"backend": backend, "reason": "exact probabilities from one statevector evolution, "
+                                                   "branching on mid-circuit measurements"}
+    elif backend == "auto":
+        selection = choose_backend(ir, max_bond_dimension)
+        backend = selection["backend"]
+        print(f"[BACKEND] {backend}: {selection['reason']}")
+    else:
+        selection = {"backend": backend, "reason": "requested"}
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown simulator backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+
+    # Packed IR is run as given; optimize JSON IR before packing it instead.
+    # Fused gates are generic unitaries, which the stabilizer method can't run.
+    report = None
+    if optimize and not isinstance(ir, PackedIR):
+        with span("optimize"):
+            ir, report = optimize_ir(ir, fuse=backend != "stabilizer")
+        if report["removed"]:
+            print(f"[OPTIMIZER] {report['gates_before']} -> {report['gates_after']} gates "
+                  f"({report['cancelled']} cancelled, {report['fused']} fused)")
+    # Packed (binary) IR runs as-is on the NumPy engines; Aer builds from JSON
+    if isinstance(ir, PackedIR) and backend not in {"numpy", "sparse"}:
+        ir = unpack_ir(ir)
 
     try:
-        job = sim.run(transpile(qc, sim), shots=1024)
-        result = job.result()
-        counts = result.get_counts()
+        start = time.perf_counter()
+        options = {"max_bond_dimension": max_bond_dimension} if backend == "mps" else {}
+        with span("simulate"):
+            if mode == "exact":
+                result = _run_exact(ir, marginals or (), threshold, sparse=backend == "sparse")
+            else:
+                result = BACKENDS[backend](ir, shots, **options)
+
+        result.update({
+            "title": title,
+            "shots": shots if mode == "counts" else None,
+            "mode": mode,
+            "num_qubits": len(ir.qubits) if isinstance(ir, PackedIR) else len(ir.get("qubits", [])),
+            "gate_counts": ir.gate_counts() if isinstance(ir, PackedIR) else count_gates(ir.get("instructions", [])),
+            "wall_time": time.perf_counter() - start,
+            "selection": selection,
+        })
+        if report is not None:
+            result["optimization"] = report
 
         print(f"\n--- {title} Simulation Results ---")
-        print("Counts:", counts)
-        print("Backend:", sim.name)
-        print("Total time taken:", result.time_taken, "seconds")
-
-        fig = plot_histogram(counts)
-        fig.suptitle(title)
-        # Save plot to PNG in memory
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png')
-        plt.close(fig)
-        buf.seek(0)
-        return buf.getvalue() 
-        
+        if mode == "exact":
+            print("Probabilities:", result["probabilities"])
+        else:
+            print("Counts:", result["counts"])
+        print("Backend:", result["backend"])
+        print("Total time taken:", result["time_taken"], "seconds")
+        return result
+
     except Exception as e:
         print(f"[SIMULATION ERROR] {e}")
+        raise
+
+
+def simulate_stream(stream, title="Quantum Simulation", shots=1024):
+    # Runs a compiled IR stream (backend.compiler.iter_ir / iter_ir_file)
+    # through the NumPy engine without materialising the program.
+    # Peek past the declarations at the first instruction: a leading convert
+    # is answered in closed form, as simulate() does
+    stream = iter(stream)
+    head = []
+    for item in stream:
+        head.append(item)
+        if not isinstance(item, tuple):
+            if item.get("op") == "convert":
+                return _convert_result(item["value"], title, "counts")
+            break
+
+    gate_counts = {}
+    qubits = []
+
+    def counted(items):
+        for item in items:
+            if isinstance(item, tuple):
+                qubits.extend(item[1])
+            else:
+                count_gates([item], gate_counts)
+            yield item
+
+    start = time.perf_counter()
+    with span("simulate"):
+        counts = run_statevector_stream(counted(itertools.chain(head, stream)), shots=shots)
+    elapsed = time.perf_counter() - start
+    result = {
+        "counts": counts,
+        "backend": "numpy_statevector_stream",
+        "time_taken": elapsed,
+        "metadata": {"method": "statevector"},
+        "title": title,
+        "shots": shots,
+        "num_qubits": len(qubits),
+        "gate_counts": gate_counts,
+        "wall_time": elapsed,
+    }
+
+    print(f"\n--- {title} Simulation Results ---")
+    print("Counts:", counts)
+    print("Backend:", result["backend"])
+    print("Total time taken:", elapsed, "seconds")
+    return result
+
+
+# Rendered histograms keyed by (counts, title, format)
+_histogram_cache = LRUCache(maxsize=32)
+
+HISTOGRAM_FORMATS = {"png", "svg"}
+
+
+def clear_histogram_cache():
+    _histogram_cache.clear()
+
 
+def render_histogram(result, fmt="png"):
+    if fmt not in HISTOGRAM_FORMATS:
+        raise ValueError(f"Unknown histogram format '{fmt}'. Choose from: {', '.join(sorted(HISTOGRAM_FORMATS))}")
+
+    # Exact-mode results plot their probabilities
+    data = result["counts"] if "counts" in result else result["probabilities"]
+    key = content_hash([data, result.get("title", ""), fmt])
+    image = _histogram_cache.get(key)
+    if image is None:
+        with span("render_histogram"):
+            fig = plot_histogram(data)
+            fig.suptitle(result.get("title", ""))
+            # Save plot in memory
+            buf = io.BytesIO()
+            fig.savefig(buf, format=fmt)
+            plt.close(fig)
+        image = buf.getvalue()
+        _histogram_cache.put(key, image)
+    return image
+
+# Aer method behind each backend choose_backend() can pick
+AER_METHODS = {"aer": None, "stabilizer": "stabilizer", "mps": "matrix_product_state"}
+
+
+def simulate_many(irs, shots=1024):
+    # Each program runs on the backend "auto" picks for it. The ones bound
+    # for the same Aer method are built (through the cache), transpiled in
+    # one call and run as a single Aer job; NumPy and sparse ones run one at
+    # a time. Each program gets {"counts": ...}, {"convert": ...} (see
+    # convert_state) or {"error": ...} at its own position.
+    results = [None] * len(irs)
+    groups = {}
+    for i, ir in enumerate(irs):
+        try:
+            value = _convert_value(ir)
+            if value is not None:
+                results[i] = {"convert": convert_state(value)}
+                continue
+            backend = choose_backend(ir)["backend"]
+            if backend not in AER_METHODS:
+                results[i] = {"counts": BACKENDS[backend](ir, shots)["counts"]}
+                continue
+            entry = compile_circuit(ir)
+            errors = [payload for kind, payload in entry["log"] if kind == "error"]
+            if errors:
+                results[i] = {"error": errors[0]}
+                continue
+            groups.setdefault(AER_METHODS[backend], []).append((entry, i))
+        except Exception as e:
+            results[i] = {"error": str(e)}
+
+    for method, group in groups.items():
+        _run_aer_batch(group, method, shots, results)
+    return results
+
+
+def _run_aer_batch(group, method, shots, results):
+    # group: (circuit cache entry, position in results) pairs
+    sim = get_aer_backend(method)
+    run_options = {}
+    if method == "matrix_product_state":
+        run_options["matrix_product_state_max_bond_dimension"] = MPS_MAX_BOND_DIMENSION
+    pending = [e for e, _ in group if sim.name not in e["transpiled"] and not _runs_untranspiled(e, sim)]
+    if pending:
+        try:
+            with span("transpile"):
+                transpiled = transpile([e["circuit"] for e in pending], sim, optimization_level=_transpile_level(sim))
+            for entry, circuit in zip(pending, transpiled):
+                entry["transpiled"][sim.name] = circuit
+        except Exception:
+            # One bad circuit fails the whole call; the loop below transpiles
+            # the rest one at a time and reports the failures
+            pass
+
+    circuits, runnable = [], []
+    for entry, i in group:
+        try:
+            circuits.append(transpile_cached(entry, sim))
+            runnable.append(i)
+        except Exception as e:
+            results[i] = {"error": str(e)}
+    if not circuits:
+        return
+
+    try:
+        with span("aer_run"):
+            result = sim.run(circuits, shots=shots, **run_options).result()
+    except Exception:
+        # Same for the job: run the circuits separately so only the bad ones fail
+        for circuit, i in zip(circuits, runnable):
+            try:
+                with span("aer_run"):
+                    results[i] = {"counts": sim.run(circuit, shots=shots, **run_options).result().get_counts()}
+            except Exception as e:
+                results[i] = {"error": str(e)}
+        return
+    for k, i in enumerate(runnable):
+        try:
+            results[i] = {"counts": result.get_counts(k)}
+        except Exception as e:
+            results[i] = {"error": str(e)}
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Simulate IR from JSON")
-    parser.add_argument("ir_file", help="Path to IR JSON file")
+    parser.add_argument("ir_file", help="Path to IR JSON or binary IR file (or QuCPL source with --stream)")
+    parser.add_argument("--stream", action="store_true", help="Stream-compile QuCPL source statement by statement")
+    parser.add_argument("--backend", choices=["auto"] + sorted(BACKENDS), default="auto", help="Simulator backend")
+    parser.add_argument("--shots", type=int, default=1024, help="Number of shots")
+    parser.add_argument("--histogram", help="Save the histogram to this .png or .svg file")
+    parser.add_argument("--no-optimize", action="store_true", help="Simulate the IR exactly as written")
+    parser.add_argument("--max-bond-dimension", type=int, help="Bond dimension cap for the MPS backend")
+    parser.add_argument("--exact", action="store_true", help="Report exact outcome probabilities instead of shots")
+    parser.add_argument("--marginals", nargs="+", help="With --exact, classical bits to marginalise onto")
+    parser.add_argument("--threshold", type=float, default=EXACT_THRESHOLD, help="With --exact, drop outcomes at or below this probability")
     args = parser.parse_args()
 
     try:
-        with open(args.ir_file) as f:
-            ir = json.load(f)
-        simulate(ir, title=args.ir_file)
+        if args.stream:
+            from backend.compiler import iter_ir_file
+            with open(args.ir_file) as f:
+                result = simulate_stream(iter_ir_file(f), title=args.ir_file, shots=args.shots)
+        else:
+            with open(args.ir_file, "rb") as f:
+                header = f.read(4)
+            if is_binary_ir(header):
+                ir = load_binary(args.ir_file)
+            else:
+                with open(args.ir_file) as f:
+                    ir = json.load(f)
+            result = simulate(ir, title=args.ir_file, backend=args.backend, shots=args.shots,
+                              optimize=not args.no_optimize, max_bond_dimension=args.max_bond_dimension,
+                              mode="exact" if args.exact else "counts", marginals=args.marginals, threshold=args.threshold)
+        if result and args.histogram:
+            fmt = "svg" if args.histogram.endswith(".svg") else "png"
+            with open(args.histogram, "wb") as f:
+                f.write(render_histogram(result, fmt=fmt))
+            print(f"Histogram saved to {args.histogram}")
     except FileNotFoundError:
         print(f"[FILE ERROR] IR file '{args.ir_file}' not found.")
+    except ValueError as e:
+        print(f"[ERROR] {e}")
@@ -0,0 +1,571 @@
+from functools import partial
+
+import numpy as np
+
+from backend.packed import GATE_OPCODES, Opcode, PackedIR, matrix_from_json
+
+# ------------------------
+# Native NumPy statevector engine
+# ------------------------
+# The state of n qubits is kept as a tensor of shape (2,) * n. Qubit i lives on
+# axis n - 1 - i, so flattening the tensor gives the same little-endian ordering
+# Qiskit uses for basis states and count keys.
+
+SQRT1_2 = 1 / np.sqrt(2)
+
+# Weighted branching: outcomes less likely than this are not followed, and
+# no more than this many branches are kept
+BRANCH_EPSILON = 1e-12
+MAX_WEIGHTED_BRANCHES = 1 << 12
+
+GATES = {
+    "h": np.array([[SQRT1_2, SQRT1_2], [SQRT1_2, -SQRT1_2]], dtype=complex),
+    "x": np.array([[0, 1], [1, 0]], dtype=complex),
+    "y": np.array([[0, -1j], [1j, 0]], dtype=complex),
+    "z": np.array([[1, 0], [0, -1]], dtype=complex),
+}
+
+OPCODE_GATES = {opcode: opcode.name.lower() for opcode in GATE_OPCODES}
+
+# Controlled gates map to (number of controls, target gate)
+CONTROLLED_GATES = {
+    "cx": (1, "x"),
+    "cy": (1, "y"),
+    "cz": (1, "z"),
+    "ccx": (2, "x"),
+}
+
+
+def zero_state(num_qubits):
+    state = np.zeros((2,) * num_qubits, dtype=complex)
+    state[(0,) * num_qubits] = 1
+    return state
+
+
+def extend_state(state, num_new):
+    # Append num_new qubits in |0>; new qubits take the highest indices
+    new = np.zeros((2,) * num_new + state.shape, dtype=complex)
+    new[(0,) * num_new] = state
+    return new
+
+
+def _axis(state, q):
+    return state.ndim - 1 - q
+
+
+def apply_gate_axis(block, matrix, axis):
+    block = np.tensordot(matrix, block, axes=(1, axis))
+    return np.moveaxis(block, 0, axis)
+
+
+def apply_gate(state, matrix, q):
+    return apply_gate_axis(state, matrix, _axis(state, q))
+
+
+def apply_controlled(state, matrix, controls, target):
+    # Fix every control axis to |1> and apply the gate to the target axis of
+    # the resulting view, writing the block back in place.
+    index = [slice(None)] * state.ndim
+    for c in controls:
+        index[_axis(state, c)] = 1
+    index = tuple(index)
+    axis = _axis(state, target)
+    sub_axis = axis - sum(1 for c in controls if _axis(state, c) < axis)
+    state[index] = apply_gate_axis(state[index], matrix, sub_axis)
+    return state
+
+
+def apply_swap(state, a, b):
+    return np.swapaxes(state, _axis(state, a), _axis(state, b))
+
+
+def probability_one(state, q):
+    index = [slice(None)] * state.ndim
+    index[_axis(state, q)] = 1
+    return float(np.sum(np.abs(state[tuple(index)]) ** 2))
+
+
+def collapse(state, q, outcome, prob):
+    index = [slice(None)] * state.ndim
+    index[_axis(state, q)] = 1 - outcome
+    state = state.copy()
+    state[tuple(index)] = 0
+    return state / np.sqrt(prob)
+
+
+def marginal_probabilities(state, measured):
+    # Outcome probabilities of the `measured` qubits (ascending); bit k of an
+    # index is the k-th of them
+    probs = np.abs(state) ** 2
+    unmeasured = tuple(_axis(state, q) for q in range(state.ndim) if q not in measured)
+    # Remaining axes are ordered from the highest measured qubit down
+    probs = np.sum(probs, axis=unmeasured).ravel()
+    return probs / probs.sum()
+
+
+def _footprint(instructions):
+    # (qubits, classical bits) an if block's instructions touch, read or write
+    qubits, bits = set(), set()
+    for instr in instructions:
+        if instr.get("type") == "if":
+            bits.add(instr["condition"]["var"])
+            for block in (instr.get("then", []), instr.get("else", [])):
+                block_qubits, block_bits = _footprint(block)
+                qubits |= block_qubits
+                bits |= block_bits
+        elif instr.get("op") == "measure":
+            qubits.update(instr["qubits"])
+            bits.update(instr["classical"])
+        elif instr.get("op") not in {"print", "barrier", "convert"}:
+            qubits.update(instr.get("args", []))
+    return qubits, bits
+
+
+def classical_bits_of(instructions):
+    bits = set()
+    for instr in instructions:
+        if instr.get("op") == "measure":
+            bits.update(instr.get("classical", []))
+        elif instr.get("type") == "if":
+            bits.add(instr["condition"]["var"])
+            bits.update(classical_bits_of(instr.get("then", [])))
+            bits.update(classical_bits_of(instr.get("else", [])))
+    return sorted(bits)
+
+
+def is_terminal_measurement(instructions):
+    # True when every measurement can be deferred to the end of the circuit:
+    # no gate touches a qubit once it has been measured and no if block
+    # applies quantum operations (prints inside if blocks are fine).
+    measured = set()
+    for instr in instructions:
+        if instr.get("type") == "if":
+            for sub in instr.get("then", []) + instr.get("else", []):
+                if sub.get("type") == "if" or sub.get("op") not in {"print", "barrier"}:
+                    return False
+            continue
+        op = instr.get("op")
+        if op == "measure":
+            measured.update(instr["qubits"])
+        elif op not in {"print", "barrier", "convert"} and measured.intersection(instr.get("args", [])):
+            return False
+    return True
+
+
+class StatevectorEngine:
+    # Every branch is [state, classical bits, shots]. Measurements split a
+    # branch by drawing how many of its shots see each outcome, so all shots
+    # are simulated together and only distinct histories are kept. Qubits can
+    # be declared incrementally, which lets the engine consume an IR stream.
+    #
+    # With weighted=True the third field is the branch's probability instead:
+    # a measurement follows both outcomes, weighted by their probabilities,
+    # and the branches' weights are merged per outcome at the end. That gives
+    # exact results for feedback circuits at the cost of up to 2**m branches
+    # for m mid-circuit measurements (capped at max_branches).
+    def __init__(self, qubits=(), shots=1024, seed=None, weighted=False, max_branches=MAX_WEIGHTED_BRANCHES):
+        self.qmap = {}
+        self.classical_bits = set()
+        self.shots = shots
+        self.rng = np.random.default_rng(seed)
+        self.weighted = weighted
+        self.max_branches = max_branches
+        self.branches = [[zero_state(0), {}, 1.0 if weighted else shots]]
+        # Streamed measurements not collapsed yet: classical bit -> qubit
+        self.pending = {}
+        self.declare(qubits)
+
+    def declare(self, qubits):
+        new = [q for q in qubits if q not in self.qmap]
+        for q in new:
+            self.qmap[q] = len(self.qmap)
+        if new:
+            for branch in self.branches:
+                branch[0] = extend_state(branch[0], len(new))
+
+    def execute(self, instructions):
+        self.branches = self._execute(instructions, self.branches)
+
+    def execute_deferred(self, instr):
+        # Streaming counterpart of sample_terminal: a measurement is only
+        # recorded, and collapsed once a later gate touches its qubit or an
+        # if reads or rewrites its bit. sample_pending() draws the rest.
+        if instr.get("type") == "if":
+            qubits, bits = _footprint([instr])
+            # Bits written only inside a branch still get a register slot
+            self.classical_bits.update(bits)
+            self._collapse_pending({self.qmap[q] for q in qubits if q in self.qmap}, bits)
+            self.execute([instr])
+            return
+        op = instr["op"]
+        if op == "measure":
+            for q, c in zip(instr["qubits"], instr["classical"]):
+                if c in self.pending and self.pending[c] != self.qmap[q]:
+                    # The earlier measurement still collapses its qubit
+                    self._collapse_pending(set(), {c})
+                self.classical_bits.add(c)
+                self.pending[c] = self.qmap[q]
+        elif op in {"print", "barrier", "convert"}:
+            self.execute([instr])
+        else:
+            self._collapse_pending({self.qmap[q] for q in instr.get("args", []) if q in self.qmap}, set())
+            self.execute([instr])
+
+    def _collapse_pending(self, qubits, bits):
+        for c, q in list(self.pending.items()):
+            if q in qubits or c in bits:
+                del self.pending[c]
+                self.branches = self._measure(self.branches, q, c)
+
+    def sample_pending(self):
+        # One multinomial per branch over its pending qubits. The states are
+        # dropped: nothing acts on them afterwards.
+        if not self.pending:
+            return
+        measured = sorted(set(self.pending.values()))
+        position = {q: k for k, q in enumerate(measured)}
+        branches = []
+        for state, bits, shots in self.branches:
+            probs = marginal_probabilities(state, measured)
+            if self.weighted:
+                outcomes = [(index, shots * p) for index, p in enumerate(probs.tolist()) if p > BRANCH_EPSILON]
+            else:
+                samples = self.rng.multinomial(shots, probs)
+                outcomes = [(index, int(samples[index])) for index in np.flatnonzero(samples).tolist()]
+            for index, n in outcomes:
+                new_bits = dict(bits)
+                new_bits.update({c: (index >> position[q]) & 1 for c, q in self.pending.items()})
+                branches.append([None, new_bits, n])
+        self.branches = self._check_branches(branches)
+        self.pending = {}
+
+    def counts(self):
+        names = sorted(self.classical_bits)
+        if self.weighted:
+            # Draw every shot from the merged outcome distribution
+            probabilities = _branch_distribution(self.branches, names, 0.0)
+            keys = list(probabilities)
+            samples = self.rng.multinomial(self.shots, np.fromiter(probabilities.values(), dtype=float, count=len(keys)))
+            return {keys[k]: int(samples[k]) for k in np.flatnonzero(samples)}
+        counts = {}
+        for _, bits, shots in self.branches:
+            key = "".join(str(bits.get(c, 0)) for c in reversed(names))
+            counts[key] = counts.get(key, 0) + shots
+        return counts
+
+    def exact(self, marginals=(), threshold=0.0):
+        # Weighted mode: outcome probabilities merged over the branches
+        if not self.weighted:
+            raise ValueError("Exact results from branches need a weighted engine")
+        return self._exact_result(partial(_branch_distribution, self.branches), marginals, threshold)
+
+    def sample_terminal(self, instructions):
+        # Evolve the state once with measurements deferred, then draw every
+        # shot from a single multinomial over the measured qubits' marginal.
+        return self._sample_readout(*self._defer_measurements(instructions))
+
+    def exact_terminal(self, instructions, marginals=(), threshold=0.0):
+        return self._exact_readout(*self._defer_measurements(instructions), marginals, threshold)
+
+    def _defer_measurements(self, instructions):
+        readout = {}
+        conditionals = []
+        for instr in instructions:
+            if instr.get("type") == "if":
+                conditionals.append(instr)
+            elif instr.get("op") == "measure":
+                for q, c in zip(instr["qubits"], instr["classical"]):
+                    readout[c] = self.qmap[q]
+            else:
+                self.branches = self._apply(instr, self.branches)
+        return readout, conditionals
+
+    def _readout_probabilities(self, readout, conditionals):
+        # Outcome probabilities of the measured qubits; bit k of an index is
+        # the k-th measured qubit in ascending order
+        for instr in conditionals:
+            self.classical_bits.add(instr["condition"]["var"])
+        self.classical_bits.update(readout)
+
+        measured = sorted(set(readout.values()))
+        return measured, marginal_probabilities(self.branches[0][0], measured)
+
+    def _sample_readout(self, readout, conditionals):
+        measured, probs = self._readout_probabilities(readout, conditionals)
+        samples = self.rng.multinomial(self.shots, probs)
+
+        self.branches = []
+        for index in np.flatnonzero(samples):
+            qubit_values = {q: (int(index) >> k) & 1 for k, q in enumerate(measured)}
+            bits = {c: qubit_values[q] for c, q in readout.items()}
+            self.branches.append([None, bits, int(samples[index])])
+
+        self._print_conditionals(conditionals)
+        return self.counts()
+
+    def _readout_distribution(self, readout, conditionals):
+        # A function (names, threshold) -> outcome probabilities over those
+        # classical bits, for _exact_readout
+        measured, probs = self._readout_probabilities(readout, conditionals)
+        return partial(_distribution, probs, measured, readout)
+
+    def _exact_readout(self, readout, conditionals, marginals=(), threshold=0.0):
+        # Probabilities keyed like counts(), plus the marginal distribution
+        # over `marginals` (keyed the same way, over those bits only).
+        # Outcomes at or below `threshold` are dropped; "truncated" is the
+        # probability they carried.
+        distribution = self._readout_distribution(readout, conditionals)
+        result = self._exact_result(distribution, marginals, threshold)
+        for instr in conditionals:
+            values = distribution([instr["condition"]["var"]], 0.0)
+            self._print_conditional(instr, {int(key) for key in values})
+        return result
+
+    def _exact_result(self, distribution, marginals, threshold):
+        names = sorted(self.classical_bits)
+        unknown = [c for c in marginals if c not in self.classical_bits]
+        if unknown:
+            raise ValueError(f"Unknown classical bit(s) for marginals: {', '.join(unknown)}")
+
+        probabilities = distribution(names, threshold)
+        result = {
+            "probabilities": probabilities,
+            "truncated": max(0.0, 1.0 - sum(probabilities.values())),
+        }
+        if marginals:
+            result["marginals"] = distribution(sorted(set(marginals)), threshold)
+        return result
+
+    def sample_terminal_packed(self, packed):
+        return self._sample_readout(*self._defer_packed(packed))
+
+    def exact_terminal_packed(self, packed, marginals=(), threshold=0.0):
+        return self._exact_readout(*self._defer_packed(packed), marginals, threshold)
+
+    def _defer_packed(self, packed):
+        readout = {}
+        conditionals = []
+        self.branches = self._execute_packed(packed, 0, len(packed), self.branches, (readout, conditionals))
+        return readout, conditionals
+
+    def execute_packed(self, packed):
+        self.branches = self._execute_packed(packed, 0, len(packed), self.branches)
+
+    def _execute_packed(self, packed, start, stop, branches, deferred=None):
+        # Iterates the packed arrays directly; qubit operands are engine qubit
+        # indices, so the engine must have been declared with packed.qubits.
+        # With `deferred`, measurements only record their readout and if
+        # blocks are collected for printing (the terminal-measurement path).
+        opcodes, offsets, operands = packed.opcode_list, packed.offset_list, packed.operand_list
+        names = packed.names
+        i = start
+        while i < stop and branches:
+            opcode = opcodes[i]
+            args = operands[offsets[i]:offsets[i + 1]]
+            i += 1
+            if opcode == Opcode.IF:
+                var, value, then_len, else_len = args
+                if deferred is not None:
+                    deferred[1].append(packed.unpack_instruction(i - 1))
+                else:
+                    var, value = names[var], packed.constants[value]
+                    self.classical_bits.add(var)
+                    taken = [b for b in branches if b[1].get(var, 0) == value]
+                    skipped = [b for b in branches if b[1].get(var, 0) != value]
+                    branches = (self._execute_packed(packed, i, i + then_len, taken)
+                                + self._execute_packed(packed, i + then_len, i + then_len + else_len, skipped))
+                i += then_len + else_len
+            elif opcode in GATE_OPCODES:
+                branches = self._apply_gate(OPCODE_GATES[opcode], args, branches)
+            elif opcode == Opcode.UNITARY:
+                branches = self._apply_unitary(packed.matrices[args[1]], args[0], branches)
+            elif opcode == Opcode.MEASURE:
+                half = len(args) // 2
+                for q, c in zip(args[:half], args[half:]):
+                    if deferred is not None:
+                        deferred[0][names[c]] = q
+                    else:
+                        self.classical_bits.add(names[c])
+                        branches = self._measure(branches, q, names[c])
+            elif opcode == Opcode.PRINT:
+                print(f"[PRINT] {', '.join(names[a] for a in args)}")
+        return branches
+
+    def _print_conditionals(self, conditionals):
+        # After sampling: each branch holds one outcome of the readout
+        for instr in conditionals:
+            self._print_conditional(instr, {bits.get(instr["condition"]["var"], 0) for _, bits, _ in self.branches})
+
+    def _print_conditional(self, instr, values):
+        # `values` are the outcomes the condition bit can take
+        cond = instr["condition"]
+        if cond["value"] in values:
+            self._execute(instr.get("then", []), [None])
+        if any(v != cond["value"] for v in values):
+            self._execute(instr.get("else", []), [None])
+
+    def _execute(self, instructions, branches):
+        for instr in instructions:
+            if not branches:
+                break
+            if instr.get("type") == "if":
+                branches = self._execute_if(instr, branches)
+            else:
+                branches = self._apply(instr, branches)
+        return branches
+
+    def _execute_if(self, instr, branches):
+        cond = instr["condition"]
+        var = cond["var"]
+        self.classical_bits.add(var)
+        taken = [b for b in branches if b[1].get(var, 0) == cond["value"]]
+        skipped = [b for b in branches if b[1].get(var, 0) != cond["value"]]
+        return self._execute(instr.get("then", []), taken) + self._execute(instr.get("else", []), skipped)
+
+    def _apply_gate(self, op, qs, branches):
+        if op in GATES:
+            for branch in branches:
+                branch[0] = apply_gate(branch[0], GATES[op], qs[0])
+        elif op in CONTROLLED_GATES:
+            num_controls, gate = CONTROLLED_GATES[op]
+            for branch in branches:
+                branch[0] = apply_controlled(branch[0], GATES[gate], qs[:num_controls], qs[num_controls])
+        elif op == "swap":
+            for branch in branches:
+                branch[0] = apply_swap(branch[0], qs[0], qs[1])
+        return branches
+
+    def _apply_unitary(self, matrix, q, branches):
+        for branch in branches:
+            branch[0] = apply_gate(branch[0], matrix, q)
+        return branches
+
+    def _apply(self, instr, branches):
+        op = instr["op"]
+        args = instr.get("args", [])
+        if op in GATES or op in CONTROLLED_GATES or op == "swap":
+            branches = self._apply_gate(op, [self.qmap[a] for a in args], branches)
+        elif op == "unitary":
+            branches = self._apply_unitary(matrix_from_json(instr["matrix"]), self.qmap[args[0]], branches)
+        elif op == "measure":
+            for q, c in zip(instr["qubits"], instr["classical"]):
+                self.classical_bits.add(c)
+                branches = self._measure(branches, self.qmap[q], c)
+        elif op == "print":
+            print(f"[PRINT] {', '.join(args)}")
+        elif op in {"barrier", "convert"}:
+            pass
+        else:
+            raise ValueError(f"Unsupported op '{op}' for the statevector engine")
+        return branches
+
+    def _split(self, shots, p1):
+        # (outcome, shots or weight, probability) for each outcome a branch
+        # continues with
+        if self.weighted:
+            return [(outcome, shots * p, p) for outcome, p in ((0, 1 - p1), (1, p1)) if p > BRANCH_EPSILON]
+        ones = int(self.rng.binomial(shots, p1))
+        return [(outcome, n, p) for outcome, n, p in ((0, shots - ones, 1 - p1), (1, ones, p1)) if n]
+
+    def _check_branches(self, branches):
+        if self.weighted and len(branches) > self.max_branches:
+            raise ValueError(f"Mid-circuit measurements split the state into more than {self.max_branches} "
+                             "branches; sample shots instead")
+        return branches
+
+    def _measure(self, branches, q, c):
+        result = []
+        for state, bits, shots in branches:
+            p1 = min(max(probability_one(state, q), 0.0), 1.0)
+            for outcome, n, prob in self._split(shots, p1):
+                new_bits = dict(bits)
+                new_bits[c] = outcome
+                result.append([collapse(state, q, outcome, prob), new_bits, n])
+        return self._check_branches(result)
+
+
+def _branch_distribution(branches, names, threshold):
+    # Weighted branches merged per outcome over `names`, keyed like counts
+    result = {}
+    for _, bits, weight in branches:
+        key = "".join(str(bits.get(c, 0)) for c in reversed(names))
+        result[key] = result.get(key, 0.0) + weight
+    total = sum(result.values())
+    return {key: p / total for key, p in result.items() if p / total > threshold}
+
+
+def _distribution(probs, measured, readout, names, threshold):
+    # Sums `probs` (indexed by measured qubit, see _readout_probabilities)
+    # down to the qubits behind `names` and keys it like count keys: the
+    # highest name first, unmeasured bits reading 0
+    qubits = sorted({readout[c] for c in names if c in readout})
+    tensor = probs.reshape((2,) * len(measured))
+    other = tuple(len(measured) - 1 - k for k, q in enumerate(measured) if q not in qubits)
+    probs = np.sum(tensor, axis=other).ravel() if other else tensor.ravel()
+    position = {q: k for k, q in enumerate(qubits)}
+    shifts = [position[readout[c]] if c in readout else None for c in reversed(names)]
+
+    result = {}
+    for index in np.flatnonzero(probs > threshold).tolist():
+        key = "".join("0" if k is None else str((index >> k) & 1) for k in shifts)
+        result[key] = result.get(key, 0.0) + float(probs[index])
+    return result
+
+
+def run_statevector(ir, shots=1024, seed=None, engine_class=StatevectorEngine, weighted=False):
+    # Feedback circuits branch per shot group, or with weighted=True per
+    # outcome probability (shots are then drawn once at the end)
+    if isinstance(ir, PackedIR):
+        return run_packed(ir, shots=shots, seed=seed, engine_class=engine_class, weighted=weighted)
+
+    instructions = ir.get("instructions", [])
+    if is_terminal_measurement(instructions):
+        return engine_class(ir.get("qubits", []), shots=shots, seed=seed).sample_terminal(instructions)
+    engine = engine_class(ir.get("qubits", []), shots=shots, seed=seed, weighted=weighted)
+    engine.classical_bits.update(classical_bits_of(instructions))
+    engine.execute(instructions)
+    return engine.counts()
+
+
+def run_packed(packed, shots=1024, seed=None, engine_class=StatevectorEngine, weighted=False):
+    if packed.is_terminal_measurement():
+        return engine_class(packed.qubits, shots=shots, seed=seed).sample_terminal_packed(packed)
+    engine = engine_class(packed.qubits, shots=shots, seed=seed, weighted=weighted)
+    engine.classical_bits.update(packed.classical_bits())
+    engine.execute_packed(packed)
+    return engine.counts()
+
+
+def exact_statevector(ir, marginals=(), threshold=0.0, engine_class=StatevectorEngine):
+    # Exact outcome probabilities. Circuits measured only at the end take one
+    # evolution; feedback circuits are followed through weighted branches.
+    if isinstance(ir, PackedIR):
+        if ir.is_terminal_measurement():
+            return engine_class(ir.qubits).exact_terminal_packed(ir, marginals, threshold)
+        engine = engine_class(ir.qubits, weighted=True)
+        engine.classical_bits.update(ir.classical_bits())
+        engine.execute_packed(ir)
+        return engine.exact(marginals, threshold)
+
+    instructions = ir.get("instructions", [])
+    if is_terminal_measurement(instructions):
+        return engine_class(ir.get("qubits", [])).exact_terminal(instructions, marginals, threshold)
+    engine = engine_class(ir.get("qubits", []), weighted=True)
+    engine.classical_bits.update(classical_bits_of(instructions))
+    engine.execute(instructions)
+    return engine.exact(marginals, threshold)
+
+
+def run_statevector_stream(stream, shots=1024, seed=None):
+    # Consumes compiled IR items one at a time (see backend.compiler.iter_ir),
+    # so only the current statement and the state are held in memory: one
+    # state per distinct mid-circuit outcome, since measurements nothing
+    # depends on are sampled at the end
+    engine = StatevectorEngine(shots=shots, seed=seed)
+    for item in stream:
+        if isinstance(item, tuple) and item[0] == "qubits":
+            engine.declare(item[1])
+        else:
+            engine.execute_deferred(item)
+    engine.sample_pending()
+    return engine.counts()
@@ -0,0 +1,123 @@
+import argparse
+import time
+
+from backend.compiler import ast_to_ir, compile_stmt
+from backend.parser import parse_qucpl
+from benchmarks.workloads import random_program
+
+
+# ------------------------
+# Legacy Compiler
+# ------------------------
+# The recursive implementation backend/compiler.py used before the single-pass
+# rewrite, kept here as the baseline.
+def legacy_flatten(lst):
+    if isinstance(lst, list):
+        result = []
+        for item in lst:
+            if isinstance(item, list):
+                result.extend(legacy_flatten(item))
+            else:
+                result.append(item)
+        return result
+    return [lst]
+
+def legacy_compile_stmt(stmt):
+    stype = stmt["type"]
+    if stype == "QubitDecl":
+        return ("qubits", legacy_flatten(stmt["qubits"]))
+    elif stype == "QuantumOp":
+        return {"op": stmt["gate"], "args": legacy_flatten(stmt["qubits"])}
+    elif stype == "Barrier":
+        return {"op": "barrier", "args": legacy_flatten(stmt["qubits"])}
+    elif stype == "Measure":
+        return {"op": "measure", "qubits": legacy_flatten(stmt["qubits"]), "classical": legacy_flatten(stmt["classical"])}
+    elif stype == "Print":
+        return {"op": "print", "args": legacy_flatten(stmt["args"])}
+    elif stype == "Convert":
+        return {"op": "convert", "value": stmt["value"]}
+    elif stype == "If":
+        then_block = stmt["then"]
+        else_block = stmt.get("else", [])
+        then_stmts = then_block if isinstance(then_block, list) else [then_block]
+        else_stmts = else_block if isinstance(else_block, list) else ([else_block] if else_block else [])
+        return {
+            "type": "if",
+            "condition": stmt["condition"],
+            "then": [legacy_compile_stmt(s) for s in then_stmts],
+            "else": [legacy_compile_stmt(s) for s in else_stmts]
+        }
+    else:
+        raise ValueError(f"Unknown statement type: {stype}")
+
+def legacy_ast_to_ir(ast):
+    if ast.get("type") != "Program":
+        ast = {"type": "Program", "body": [ast]}
+
+    ir = {"type": "Program", "qubits": [], "instructions": []}
+
+    for stmt in ast["body"]:
+        compiled = legacy_compile_stmt(stmt)
+        if isinstance(compiled, tuple) and compiled[0] == "qubits":
+            ir["qubits"].extend(compiled[1])
+        else:
+            ir["instructions"].append(compiled)
+
+    return ir
+
+
+def legacy_iter_ir(ast):
+    return [legacy_compile_stmt(stmt) for stmt in ast["body"]]
+
+def iter_ir_list(ast):
+    # backend.compiler.iter_ir over an already parsed body
+    return [compile_stmt(stmt) for stmt in ast["body"]]
+
+
+def with_feedback(source, num_qubits, every=10):
+    # Adds an if/else on a measured bit after every `every` lines
+    lines = source.splitlines()
+    out = [lines[0]]
+    for i, line in enumerate(lines[1:-1], 1):
+        out.append(line)
+        if i % every == 0:
+            q = f"q{i % num_qubits}"
+            out.append(f"measure {q} -> m{i};")
+            out.append(f"if (m{i} == 1) {{ qop x {q}; }} else {{ qop z {q}; }}")
+    out.append(lines[-1])
+    return "\n".join(out) + "\n"
+
+
+def best_of(fn, ast, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(ast)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the single-pass compiler with the legacy recursive one")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Number of qop lines")
+    parser.add_argument("--qubits", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5, help="Best of this many runs")
+    args = parser.parse_args()
+
+    # ast_to_ir compiles a whole program; iter_ir one statement at a time
+    paths = (("ast_to_ir", legacy_ast_to_ir, ast_to_ir), ("iter_ir", legacy_iter_ir, iter_ir_list))
+    print(f"{'lines':>8} {'program':>9} {'path':>10} {'legacy (s)':>11} {'current (s)':>12} {'speedup':>8}")
+    for size in args.sizes:
+        plain = random_program(args.qubits, size)
+        for name, source in (("plain", plain), ("feedback", with_feedback(plain, args.qubits))):
+            ast = parse_qucpl(source, use_cache=False)
+            for path, legacy_fn, current_fn in paths:
+                if current_fn(ast) != legacy_fn(ast):
+                    raise SystemExit(f"[MISMATCH] {path} differs from the legacy compiler for {name}/{size}")
+                legacy = best_of(legacy_fn, ast, args.repeat)
+                current = best_of(current_fn, ast, args.repeat)
+                print(f"{size:>8} {name:>9} {path:>10} {legacy:>11.4f} {current:>12.4f} {legacy / current:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
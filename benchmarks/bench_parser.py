@@ -0,0 +1,43 @@
+import argparse
+import time
+import tracemalloc
+
+from backend.parser import get_direct_parser, get_parser, parse_qucpl
+from benchmarks.workloads import random_program
+
+
+def measure(source, direct):
+    tracemalloc.start()
+    start = time.perf_counter()
+    parse_qucpl(source, use_cache=False, direct=direct)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tree+Transformer parsing with direct AST construction")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="Number of qop lines")
+    parser.add_argument("--qubits", type=int, default=8)
+    args = parser.parse_args()
+
+    # Build both parsers up front so grammar analysis is not timed
+    get_parser()
+    get_direct_parser()
+
+    print(f"{'lines':>8} {'mode':>8} {'time (s)':>10} {'peak (MiB)':>11}")
+    for size in args.sizes:
+        source = random_program(args.qubits, size)
+        results = {}
+        for mode, direct in (("tree", False), ("direct", True)):
+            results[mode] = measure(source, direct)
+            elapsed, peak = results[mode]
+            print(f"{size:>8} {mode:>8} {elapsed:>10.3f} {peak / 2**20:>11.1f}")
+        speedup = results["tree"][0] / results["direct"][0]
+        saving = 1 - results["direct"][1] / results["tree"][1]
+        print(f"{size:>8} {'':>8} {speedup:>9.2f}x {saving:>10.0%} less")
+
+
+if __name__ == "__main__":
+    main()
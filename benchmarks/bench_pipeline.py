@@ -0,0 +1,149 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import warnings
+from importlib import metadata
+
+from backend.compiler import ast_to_ir
+from backend.parser import get_direct_parser, parse_qucpl
+from backend.profiling import collect
+from backend.simulator import clear_circuit_cache, clear_histogram_cache, render_histogram, simulate
+from benchmarks.workloads import WORKLOADS
+
+DEFAULT_SIZES = {
+    "ghz": [4, 8, 16],
+    "clifford": [4, 8, 12],
+    "cx_chain": [10, 100, 1000],
+    "feedback": [4, 16, 64],
+    "random": [100, 1000, 10000],
+    "ripple": [32, 100, 300],
+}
+
+
+def _version(package):
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def run_once(source, backend, shots, render):
+    # One cold pass through the pipeline; stage times come from the spans
+    clear_circuit_cache()
+    clear_histogram_cache()
+    with contextlib.redirect_stdout(io.StringIO()), collect() as profile:
+        ir = ast_to_ir(parse_qucpl(source, use_cache=False))
+        result = simulate(ir, title="bench", backend=backend, shots=shots)
+        if render and result:
+            render_histogram(result)
+    timings = profile.timings()
+    timings["total"] = profile.total()
+    return timings, result["backend"] if result else None
+
+
+def run_workload(name, size, backend, shots, repeat, render):
+    generator, _ = WORKLOADS[name]
+    source = generator(size)
+    runs = []
+    for _ in range(repeat):
+        timings, used = run_once(source, backend, shots, render)
+        runs.append(timings)
+    stages = {}
+    for stage in runs[0]:
+        samples = [r.get(stage, 0.0) for r in runs]
+        stages[stage] = {"median": statistics.median(samples), "min": min(samples)}
+    return {
+        "workload": name,
+        "size": size,
+        "lines": source.count("\n"),
+        "backend": used,
+        "stages": stages,
+    }
+
+
+def compare(results, baseline, threshold, min_seconds):
+    # Stages whose median grew by more than `threshold`x over the baseline;
+    # stages faster than min_seconds in the baseline are too noisy to judge
+    previous = {(r["workload"], r["size"]): r["stages"] for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = previous.get((r["workload"], r["size"]))
+        if old is None:
+            continue
+        for stage, t in r["stages"].items():
+            if stage not in old or old[stage]["median"] < min_seconds:
+                continue
+            ratio = t["median"] / old[stage]["median"]
+            if ratio > threshold:
+                regressions.append((r["workload"], r["size"], stage, old[stage]["median"], t["median"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time parse/compile/simulate/render on generated QuCPL workloads")
+    parser.add_argument("--workloads", nargs="+", choices=sorted(WORKLOADS), default=sorted(WORKLOADS))
+    parser.add_argument("--sizes", type=int, nargs="+", help="Sizes for every workload (default: per-workload sizes)")
+    parser.add_argument("--backend", default="auto", help="Simulator backend passed to simulate()")
+    parser.add_argument("--shots", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per workload and size; medians are reported")
+    parser.add_argument("--no-render", action="store_true", help="Skip histogram rendering")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio counted as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.001, help="Ignore baseline stages faster than this")
+    args = parser.parse_args()
+    # Histograms with many bars make matplotlib warn about tight_layout
+    warnings.simplefilter("ignore", UserWarning)
+
+    # Grammar analysis and Aer start-up are one-time costs, not per-request ones
+    get_direct_parser()
+    run_once(WORKLOADS["ghz"][0](2), args.backend, 16, not args.no_render)
+
+    results = []
+    print(f"{'workload':>9} {'size':>6} {'backend':>24} {'parse':>9} {'compile':>9} {'simulate':>9} {'render':>9} {'total':>9}")
+    for name in args.workloads:
+        for size in args.sizes or DEFAULT_SIZES[name]:
+            r = run_workload(name, size, args.backend, args.shots, args.repeat, not args.no_render)
+            results.append(r)
+            ms = {stage: t["median"] * 1000 for stage, t in r["stages"].items()}
+            print(f"{name:>9} {size:>6} {str(r['backend']):>24} {ms.get('parse', 0):>9.2f} {ms.get('compile', 0):>9.2f} "
+                  f"{ms.get('simulate', 0):>9.2f} {ms.get('render_histogram', 0):>9.2f} {ms['total']:>9.2f}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": _version("numpy"),
+            "lark": _version("lark"),
+            "qiskit": _version("qiskit"),
+            "qiskit_aer": _version("qiskit-aer"),
+            "backend": args.backend,
+            "shots": args.shots,
+            "repeat": args.repeat,
+            "units": "seconds",
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+        for workload, size, stage, old, new, ratio in regressions:
+            print(f"[REGRESSION] {workload}/{size} {stage}: {old * 1000:.2f} ms -> {new * 1000:.2f} ms ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
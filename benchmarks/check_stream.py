@@ -0,0 +1,63 @@
+import argparse
+import contextlib
+import io
+import random
+
+from backend.compiler import ast_to_ir, iter_ir_file
+from backend.parser import parse_qucpl
+from backend.simulator import simulate, simulate_stream
+
+
+def branching_program(num_qubits, num_rounds, seed=0):
+    # If/else rounds whose branches apply gates and measure into bits that
+    # may be written nowhere else, then a final measurement of every qubit
+    rng = random.Random(seed)
+    qubits = [f"q{i}" for i in range(num_qubits)]
+    lines = [f"qubit {', '.join(qubits)};"]
+    for r in range(num_rounds):
+        a, b = rng.choice(qubits), rng.choice(qubits)
+        lines.append(f"qop h {a};")
+        if rng.random() < 0.5:
+            lines.append(f"measure {a} -> m{r};")
+        then_block = f"measure {b} -> t{r};" if rng.random() < 0.5 else f"qop x {b};"
+        else_block = f"measure {a} -> e{r};" if rng.random() < 0.5 else f"qop z {a};"
+        lines.append(f"if (m{r} == {rng.randint(0, 1)}) {{ {then_block} }} else {{ {else_block} }}")
+    lines.append(f"measure {', '.join(qubits)} -> {', '.join(f'c{i}' for i in range(num_qubits))};")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check simulate_stream reports the same outcomes as simulate")
+    parser.add_argument("--programs", type=int, default=50)
+    parser.add_argument("--qubits", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--shots", type=int, default=256)
+    args = parser.parse_args()
+
+    failures = 0
+    for seed in range(args.programs):
+        source = branching_program(args.qubits, args.rounds, seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            streamed = simulate_stream(iter_ir_file(io.StringIO(source)), shots=args.shots)["counts"]
+            exact = simulate(ast_to_ir(parse_qucpl(source)), mode="exact")["probabilities"]
+        # Sampling may miss rare outcomes, but every streamed key must be a
+        # possible outcome over the same classical register
+        if not set(streamed) <= set(exact):
+            failures += 1
+            print(f"[MISMATCH] seed {seed}: streamed {sorted(set(streamed) - set(exact))} not in {sorted(exact)}")
+    # A leading convert is answered in closed form on both paths
+    for value in (0, 3, 10):
+        source = f"qubit q0; convert {value};"
+        with contextlib.redirect_stdout(io.StringIO()):
+            streamed = simulate_stream(iter_ir_file(io.StringIO(source)), shots=args.shots)
+            direct = simulate(ast_to_ir(parse_qucpl(source)), shots=args.shots)
+        if streamed.get("convert") != direct.get("convert"):
+            failures += 1
+            print(f"[MISMATCH] convert {value}: streamed {streamed.get('counts')}, expected {direct['probabilities']}")
+    if failures:
+        raise SystemExit(f"{failures} programs disagree")
+    print(f"Streamed and non-streamed outcomes agree on {args.programs} programs and leading converts")
+
+
+if __name__ == "__main__":
+    main()
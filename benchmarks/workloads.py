@@ -0,0 +1,99 @@
+import random
+
+# ------------------------
+# Generated QuCPL Programs
+# ------------------------
+SINGLE_QUBIT_GATES = ["h", "x", "y", "z"]
+TWO_QUBIT_GATES = ["cx", "cy", "cz", "swap"]
+
+
+def random_program(num_qubits, num_gates, seed=0):
+    rng = random.Random(seed)
+    qubits = [f"q{i}" for i in range(num_qubits)]
+    lines = [f"qubit {', '.join(qubits)};"]
+    for _ in range(num_gates):
+        if num_qubits > 1 and rng.random() < 0.4:
+            a, b = rng.sample(qubits, 2)
+            lines.append(f"qop {rng.choice(TWO_QUBIT_GATES)} {a}, {b};")
+        else:
+            lines.append(f"qop {rng.choice(SINGLE_QUBIT_GATES)} {rng.choice(qubits)};")
+    clbits = [f"c{i}" for i in range(num_qubits)]
+    lines.append(f"measure {', '.join(qubits)} -> {', '.join(clbits)};")
+    return "\n".join(lines) + "\n"
+
+
+def _program(qubits, body, measured=None):
+    measured = qubits if measured is None else measured
+    clbits = [f"c{i}" for i in range(len(measured))]
+    lines = [f"qubit {', '.join(qubits)};"] + body
+    lines.append(f"measure {', '.join(measured)} -> {', '.join(clbits)};")
+    return "\n".join(lines) + "\n"
+
+
+def ghz_program(num_qubits):
+    qubits = [f"q{i}" for i in range(num_qubits)]
+    body = ["qop h q0;"] + [f"qop cx {a}, {b};" for a, b in zip(qubits, qubits[1:])]
+    return _program(qubits, body)
+
+
+def clifford_layers_program(num_qubits, num_layers, seed=0):
+    # Each layer: a random h/x/y/z/none on every qubit, then cx or cz on a
+    # random pairing of the qubits
+    rng = random.Random(seed)
+    qubits = [f"q{i}" for i in range(num_qubits)]
+    body = []
+    for _ in range(num_layers):
+        for q in qubits:
+            gate = rng.choice(SINGLE_QUBIT_GATES + [None])
+            if gate:
+                body.append(f"qop {gate} {q};")
+        order = rng.sample(qubits, num_qubits)
+        for a, b in zip(order[::2], order[1::2]):
+            body.append(f"qop {rng.choice(['cx', 'cz'])} {a}, {b};")
+    return _program(qubits, body)
+
+
+def cx_chain_program(num_qubits, depth):
+    # `depth` sweeps of a cx ladder down the register after an initial h
+    qubits = [f"q{i}" for i in range(num_qubits)]
+    body = ["qop h q0;"]
+    for _ in range(depth):
+        body.extend(f"qop cx {a}, {b};" for a, b in zip(qubits, qubits[1:]))
+    return _program(qubits, body)
+
+
+def feedback_program(num_qubits, num_rounds, seed=0):
+    # Mid-circuit measurements each followed by an if/else correction
+    rng = random.Random(seed)
+    qubits = [f"q{i}" for i in range(num_qubits)]
+    body = []
+    for r in range(num_rounds):
+        a, b = rng.sample(qubits, 2) if num_qubits > 1 else (qubits[0], qubits[0])
+        body.append(f"qop h {a};")
+        if a != b:
+            body.append(f"qop cx {a}, {b};")
+        body.append(f"measure {a} -> m{r};")
+        body.append(f"if (m{r} == 1) {{ qop x {b}; }} else {{ qop z {b}; }}")
+    return _program(qubits, body)
+
+
+def ripple_program(num_qubits, num_inputs=2):
+    # Reversible logic: a few inputs in superposition, the rest set with x,
+    # then a ccx/cx ripple down the register (few nonzero amplitudes)
+    qubits = [f"q{i}" for i in range(num_qubits)]
+    body = [f"qop h {q};" for q in qubits[:num_inputs]]
+    body += [f"qop x {q};" for q in qubits[num_inputs::3]]
+    body += [f"qop ccx {a}, {b}, {c};" for a, b, c in zip(qubits, qubits[1:], qubits[2:])]
+    body += [f"qop cx {a}, {b};" for a, b in zip(qubits[::2], qubits[1::2])]
+    return _program(qubits, body)
+
+
+# name -> (generator taking a size, what the size means)
+WORKLOADS = {
+    "ghz": (ghz_program, "qubits"),
+    "clifford": (lambda n: clifford_layers_program(n, n), "qubits (and layers)"),
+    "cx_chain": (lambda depth: cx_chain_program(12, depth), "ladder sweeps over 12 qubits"),
+    "feedback": (lambda rounds: feedback_program(6, rounds), "if/else rounds over 6 qubits"),
+    "random": (lambda gates: random_program(8, gates), "gates over 8 qubits"),
+    "ripple": (ripple_program, "qubits"),
+}
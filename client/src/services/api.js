@@ -35,6 +35,16 @@ export const getSimulation = (ir) => {
   return api.post('/run/simulate', { ir }, { responseType: 'blob' });
 };
 
+// Parse + compile + simulate in one request. `include` can list
+// 'ast', 'ir' and 'histogram' (base64 PNG) to get those back as well.
+export const runCode = (code, include = ['histogram']) => {
+  return api.post('/run/run', { code, include });
+};
+
+export const analyzeIr = (ir) => {
+  return api.post('/run/analyze', { ir });
+};
+
 // --- Project Functions ---
 
 export const saveProject = (name, code) => {
@@ -1,18 +1,49 @@
 
+import base64
 import io
-from flask import Flask, request, jsonify, send_file
+from concurrent.futures import TimeoutError
+from flask import Flask, Response, g, request, jsonify, send_file
 from flask_cors import CORS
 
 # Import your existing backend logic
-from backend.parser import parse_qucpl
+from backend.parser import parse_qucpl, parse_cache_info
 from backend.visualize import visualize_circuit
 from backend.compiler import ast_to_ir
-from backend.simulator import simulate
+from backend.optimizer import optimize_ir
+from backend.analysis import analyze_ir
+from backend.profiling import prometheus_text, server_timing_header, start_profile, stop_profile
+from backend.binary_ir import MIMETYPE as BINARY_IR_MIMETYPE, dumps_binary, loads_binary, loads_binary_many
+from backend.packed import unpack_ir
+from backend.simulator import circuit_cache_info
+from workers import simulator_pool
+from jobs import job_store, JobQueueFull
 # Assuming your visualize/simulate functions can return image data
 
 app = Flask(__name__)
 
-CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
+CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}}, expose_headers=["Server-Timing"])
+
+# Every request collects its stage timings (see backend.profiling). JSON
+# responses carry them as "timings"; all responses get a Server-Timing header.
+@app.before_request
+def _start_profile():
+    g.profile, g.profile_token = start_profile()
+
+@app.after_request
+def _add_server_timing(response):
+    if "profile" in g:
+        response.headers["Server-Timing"] = server_timing_header(_timings())
+    return response
+
+@app.teardown_request
+def _stop_profile(exc):
+    if "profile_token" in g:
+        stop_profile(g.pop("profile_token"))
+
+def _timings():
+    timings = g.profile.timings()
+    timings["total"] = g.profile.total()
+    return timings
 
 @app.route('/parse', methods=['POST'])
 def handle_parse():
@@ -20,24 +51,43 @@ def handle_parse():
         code = request.json['code']
         ast = parse_qucpl(code)
         # You'll need to make sure your AST is JSON-serializable
-        return jsonify({"ast": ast})
+        return jsonify({"ast": ast, "timings": _timings()})
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+def _flag(value, default):
+    # JSON booleans, or "0"/"false"/"no" from a query string
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.lower() not in {"0", "false", "no"}
+    return bool(value)
+
 @app.route('/compile', methods=['POST'])
 def handle_compile():
     try:
         ast = request.json['ast']
         ir = ast_to_ir(ast)
+        report = None
+        if _flag(request.json.get('optimize'), False):
+            ir, report = optimize_ir(ir)
+        if request.args.get('format') == 'binary':
+            return send_file(io.BytesIO(dumps_binary(ir)), mimetype=BINARY_IR_MIMETYPE)
         # Ensure IR is also JSON-serializable
-        return jsonify({"ir": ir})
+        if report is not None:
+            return jsonify({"ir": ir, "optimization": report, "timings": _timings()})
+        return jsonify({"ir": ir, "timings": _timings()})
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+def _binary_body():
+    # Binary IR bodies carry any options in the query string
+    return request.mimetype == BINARY_IR_MIMETYPE
+
 @app.route('/visualize', methods=['POST'])
 def handle_visualize():
     try:
-        ir = request.json['ir']
+        ir = unpack_ir(loads_binary(request.get_data())) if _binary_body() else request.json['ir']
         # Modify visualize_circuit to return image data (e.g., a PIL Image)
         # instead of displaying it.
         img_data = visualize_circuit(ir, title="Quantum Circuit") # This function needs to return image bytes
@@ -50,19 +100,158 @@ def handle_visualize():
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.route('/analyze', methods=['POST'])
+def handle_analyze():
+    # Depth, ASAP/ALAP layers, critical path and per-qubit timelines of an IR
+    # (or of QuCPL source passed as "code")
+    try:
+        if _binary_body():
+            ir = unpack_ir(loads_binary(request.get_data()))
+        else:
+            ir = request.json['ir'] if 'ir' in request.json else ast_to_ir(parse_qucpl(request.json['code']))
+        return jsonify({"analysis": analyze_ir(ir), "timings": _timings()})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+IMAGE_MIMETYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+def _simulate_options(options):
+    # simulate() keyword options from a JSON body or query string; query
+    # strings list marginal bits comma-separated
+    result = {
+        "optimize": _flag(options.get('optimize'), True),
+        "mode": options.get('mode', 'counts'),
+    }
+    marginals = options.get('marginals')
+    if isinstance(marginals, str):
+        marginals = [m for m in marginals.split(",") if m]
+    if marginals:
+        result["marginals"] = marginals
+    if options.get('threshold') is not None:
+        result["threshold"] = float(options['threshold'])
+    if options.get('max_bond_dimension') is not None:
+        result["max_bond_dimension"] = int(options['max_bond_dimension'])
+    return result
+
+def _check_format(fmt):
+    if fmt != "json" and fmt not in IMAGE_MIMETYPES:
+        raise ValueError(f"Unknown format '{fmt}'. Choose from: json, png, svg")
+    return fmt
+
 @app.route('/simulate', methods=['POST'])
 def handle_simulate():
     try:
-        ir = request.json['ir']
-        # Modify simulate to return the histogram image data
-        histogram_img = simulate(ir, title="Simulation") # This function needs to return image bytes
-        
+        if _binary_body():
+            ir = loads_binary(request.get_data())
+            options = request.args
+        else:
+            ir = request.json['ir']
+            options = request.json
+        backend = options.get('backend', 'auto')
+        shots = int(options.get('shots', 1024))
+        # PNG stays the default for existing clients; format=json skips rendering
+        fmt = _check_format(request.args.get('format', options.get('format', 'png')))
+        result, image = simulator_pool.simulate(ir, title="Simulation", backend=backend, shots=shots, fmt=fmt,
+                                                **_simulate_options(options))
+
+        if fmt == "json":
+            return jsonify({**result, "timings": _timings()})
         return send_file(
-            io.BytesIO(histogram_img),
-            mimetype='image/png'
+            io.BytesIO(image),
+            mimetype=IMAGE_MIMETYPES[fmt]
         )
+    except TimeoutError:
+        return jsonify({"error": f"Simulation exceeded {simulator_pool.timeout} seconds"}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.route('/run', methods=['POST'])
+def handle_run():
+    # Source -> AST -> IR -> simulation in one request. Intermediate artifacts
+    # are only sent back when listed in "include" (ast, ir, histogram).
+    try:
+        code = request.json['code']
+        backend = request.json.get('backend', 'auto')
+        shots = int(request.json.get('shots', 1024))
+        include = set(request.json.get('include', []))
+        fmt = _check_format(request.args.get('format', request.json.get('format', 'json')))
+        render = fmt if fmt != "json" else ("png" if "histogram" in include else "json")
+
+        ast = parse_qucpl(code)
+        ir = ast_to_ir(ast)
+        result, image = simulator_pool.simulate(ir, title="Simulation", backend=backend, shots=shots, fmt=render,
+                                                **_simulate_options(request.json))
+
+        if fmt != "json":
+            return send_file(io.BytesIO(image), mimetype=IMAGE_MIMETYPES[fmt])
+
+        response = {"result": result}
+        if "ast" in include:
+            response["ast"] = ast
+        if "ir" in include:
+            response["ir"] = ir
+        if "histogram" in include:
+            response["histogram"] = base64.b64encode(image).decode("ascii")
+        response["timings"] = _timings()
+        return jsonify(response)
+    except TimeoutError:
+        return jsonify({"error": f"Simulation exceeded {simulator_pool.timeout} seconds"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/simulate/batch', methods=['POST'])
+def handle_simulate_batch():
+    try:
+        if _binary_body():
+            # Binary IRs back to back
+            irs = [unpack_ir(ir) for ir in loads_binary_many(request.get_data())]
+            options = request.args
+        else:
+            irs = request.json['irs']
+            options = request.json
+        shots = int(options.get('shots', 1024))
+        # Counts only: no histogram rendering for batch submissions
+        results = simulator_pool.simulate_many(irs, shots=shots)
+        return jsonify({"results": results, "timings": _timings()})
+    except TimeoutError:
+        return jsonify({"error": f"Simulation exceeded {simulator_pool.timeout} seconds"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/jobs', methods=['POST'])
+def handle_submit_job():
+    try:
+        if _binary_body():
+            irs = [unpack_ir(ir) for ir in loads_binary_many(request.get_data())]
+            options = request.args
+        else:
+            irs = request.json['irs'] if 'irs' in request.json else [request.json['ir']]
+            options = request.json
+        shots = int(options.get('shots', 1024))
+        job = job_store.submit(irs, shots=shots)
+        return jsonify({"id": job.id, "status": job.status()}), 202
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 429
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def handle_get_job(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown or expired job '{job_id}'"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/cache', methods=['GET'])
+def handle_cache_stats():
+    # Stats for this process only; pool workers keep their own circuit caches
+    return jsonify({"parse": parse_cache_info(), "circuit": circuit_cache_info()})
+
+@app.route('/metrics', methods=['GET'])
+def handle_metrics():
+    # Prometheus scrape endpoint: per-stage call counts and total/max seconds
+    return Response(prometheus_text(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == '__main__':
+    simulator_pool.start()
     app.run(port=5001) # Run on a different port than the Node server
\ No newline at end of file
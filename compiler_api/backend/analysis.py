@@ -0,0 +1,163 @@
+# ------------------------
+# Circuit Analysis
+# ------------------------
+# Schedules the top-level IR instructions on wires (qubits and classical bits)
+# the way Qiskit counts depth:
+#
+#   gates        occupy their qubits for one layer
+#   measure      occupies its qubits and the classical bits it writes
+#   if           occupies its condition bit plus every qubit and classical
+#                bit used inside its blocks (barriers included, as Qiskit
+#                adds their qubits to the if_else), as a single operation;
+#                an if whose blocks only print is not scheduled
+#   barrier      takes no layer but lines up the wires it names
+#   print        has no wires and is not scheduled
+#
+# Instructions are referred to by their index in ir["instructions"].
+
+
+def _wires(instr):
+    # (quantum wires, classical wires) an instruction occupies
+    if instr.get("type") != "if":
+        op = instr["op"]
+        if op == "measure":
+            return list(instr["qubits"]), list(instr["classical"])
+        if op in {"print", "convert"}:
+            return [], []
+        return list(instr.get("args", [])), []
+
+    qubits, clbits = [], [instr["condition"]["var"]]
+    stack = list(instr.get("then", [])) + list(instr.get("else", []))
+    while stack:
+        sub = stack.pop()
+        if sub.get("type") == "if":
+            clbits.append(sub["condition"]["var"])
+            stack.extend(sub.get("then", []))
+            stack.extend(sub.get("else", []))
+        else:
+            q, c = _wires(sub)
+            qubits.extend(q)
+            clbits.extend(c)
+    if not qubits:
+        return [], []
+    return list(dict.fromkeys(qubits)), list(dict.fromkeys(clbits))
+
+
+def _label(instr):
+    return "if" if instr.get("type") == "if" else instr["op"]
+
+
+def _schedule(ops):
+    # ASAP layer per scheduled op, plus the op each one waits on longest
+    level = {}
+    last = {}
+    layers = {}
+    preds = {}
+    for i, label, wires in ops:
+        start = max((level.get(w, 0) for w in wires), default=0)
+        blocking = [last[w] for w in wires if w in last and layers[last[w]] + 1 == start]
+        if label == "barrier":
+            # Later ops on these wires now wait on whatever the barrier waited on
+            for w in wires:
+                level[w] = start
+                if blocking:
+                    last[w] = blocking[0]
+            continue
+        preds[i] = blocking[0] if blocking else None
+        layers[i] = start
+        for w in wires:
+            level[w] = start + 1
+            last[w] = i
+    return layers, preds
+
+
+def analyze_ir(ir):
+    instructions = ir.get("instructions", [])
+    qubits = list(ir.get("qubits", []))
+
+    ops = []
+    for i, instr in enumerate(instructions):
+        q, c = _wires(instr)
+        wires = q + [("c", b) for b in c]
+        if wires:
+            ops.append((i, _label(instr), wires))
+
+    asap, preds = _schedule(ops)
+    depth = max(asap.values(), default=-1) + 1
+    # ALAP is ASAP on the reversed circuit, mirrored
+    reverse, _ = _schedule(ops[::-1])
+    alap = {i: depth - 1 - layer for i, layer in reverse.items()}
+
+    layers = [[] for _ in range(depth)]
+    alap_layers = [[] for _ in range(depth)]
+    for i in sorted(asap):
+        layers[asap[i]].append(i)
+        alap_layers[alap[i]].append(i)
+
+    # Walk back from an op in the last layer along the ops each one waited on
+    critical_path = []
+    if depth:
+        i = layers[-1][0]
+        while i is not None:
+            critical_path.append(i)
+            i = preds[i]
+        critical_path.reverse()
+
+    timelines = {q: [] for q in qubits}
+    for i, label, wires in ops:
+        if i not in asap:
+            continue
+        for w in wires:
+            if w in timelines:
+                timelines[w].append({"layer": asap[i], "index": i, "op": label})
+
+    return {
+        "depth": depth,
+        "num_ops": len(asap),
+        "parallelism": len(asap) / depth if depth else 0.0,
+        "layers": layers,
+        "alap_layers": alap_layers,
+        "ops": [
+            {"index": i, "op": label, "asap": asap[i], "alap": alap[i], "slack": alap[i] - asap[i]}
+            for i, label, _ in ops if i in asap
+        ],
+        "critical_path": critical_path,
+        "timelines": timelines,
+        "qubit_busy": {q: len(t) for q, t in timelines.items()},
+    }
+
+
+def format_analysis(analysis):
+    # Console summary: depth, critical path, ASAP layers and one row per qubit
+    labels = {op["index"]: f"{op['op']}#{op['index']}" for op in analysis["ops"]}
+    lines = [
+        f"Depth: {analysis['depth']}  Ops: {analysis['num_ops']}  "
+        f"Parallelism: {analysis['parallelism']:.2f} ops/layer",
+        f"Critical path: {' -> '.join(labels[i] for i in analysis['critical_path'])}",
+    ]
+    for n, layer in enumerate(analysis["layers"]):
+        lines.append(f"  layer {n}: {', '.join(labels[i] for i in layer)}")
+
+    name_width = max((len(q) for q in analysis["timelines"]), default=0)
+    cell_width = max((len(op["op"]) for op in analysis["ops"]), default=1)
+    for q, timeline in analysis["timelines"].items():
+        row = ["."] * analysis["depth"]
+        for entry in timeline:
+            row[entry["layer"]] = entry["op"]
+        cells = " ".join(f"{cell:<{cell_width}}" for cell in row)
+        lines.append(f"  {q:<{name_width}} | {cells} | busy {analysis['qubit_busy'][q]}/{analysis['depth']}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Depth and layer analysis of IR JSON")
+    parser.add_argument("ir_file", help="Path to IR JSON file")
+    parser.add_argument("--json", action="store_true", help="Print the full analysis as JSON")
+    args = parser.parse_args()
+
+    with open(args.ir_file) as f:
+        ir = json.load(f)
+    analysis = analyze_ir(ir)
+    print(json.dumps(analysis, indent=2) if args.json else format_analysis(analysis))
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+# ------------------------
+# Content Hashing
+# ------------------------
+def content_hash(data):
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def ir_hash(ir):
+    return content_hash(ir)
+
+def source_hash(source):
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+def clone_json(node):
+    # Copy of JSON-like data (dicts, lists, scalars); much cheaper than deepcopy
+    if isinstance(node, dict):
+        return {k: clone_json(v) for k, v in node.items()}
+    if isinstance(node, list):
+        return [clone_json(v) for v in node]
+    return node
+
+
+# ------------------------
+# Bounded LRU Cache
+# ------------------------
+class LRUCache:
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
@@ -1,53 +1,69 @@
 from lark import Lark, Transformer, v_args
 import json
+import os
+import re
+
+from backend.cache import LRUCache, clone_json, source_hash
+from backend.profiling import span
+
+# grammar.lark sits next to the backend package, wherever we are run from
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "grammar.lark")
 
 # Load grammar from file
-def load_grammar(grammar_file="grammar.lark"):
+def load_grammar(grammar_file=GRAMMAR_FILE):
     with open(grammar_file) as f:
         return f.read()
 
-grammar = load_grammar()
-parser = Lark(grammar, parser='lalr', start='start')
+_parser = None
+
+def get_parser():
+    # Built on first use. cache=True stores the LALR tables on disk under a
+    # name derived from the grammar's hash, so later processes load them
+    # instead of rebuilding, and editing grammar.lark invalidates them.
+    global _parser
+    if _parser is None:
+        _parser = Lark(load_grammar(), parser='lalr', start='start', cache=True)
+    return _parser
 
 @v_args(inline=True)
 class ASTBuilder(Transformer):
     def start(self, *stmts):
         return {"type": "Program", "body": list(stmts)}
 
-    def qubit_decl(self, *ids):
-        return {"type": "QubitDecl", "qubits": list(ids)}
+    def qubit_decl(self, ids):
+        return {"type": "QubitDecl", "qubits": ids}
 
     def qop_stmt(self, gate, args):
-        return {"type": "QuantumOp", "gate": gate, "qubits": args}
+        return {"type": "QuantumOp", "gate": str(gate), "qubits": args}
 
     def barrier_stmt(self, args):
         return {"type": "Barrier", "qubits": args}
 
-    def measure_stmt(self, *args):
-        mid = len(args) // 2
-        return {"type": "Measure", "qubits": list(args[:mid]), "classical": list(args[mid:])}
+    def measure_stmt(self, qubits, classical):
+        return {"type": "Measure", "qubits": qubits, "classical": classical}
 
-    def print_stmt(self, *args):
-        return {"type": "Print", "args": list(args)}
+    def print_stmt(self, args):
+        return {"type": "Print", "args": args}
 
-    def if_stmt(self, cond, *blocks):
-        if_block = blocks[0]
-        else_block = blocks[1] if len(blocks) > 1 else None
+    def if_stmt(self, cond, then_block, else_block=None):
         return {
             "type": "If",
             "condition": cond,
-            "then": if_block,
+            "then": then_block,
             "else": else_block
         }
 
+    def block(self, *stmts):
+        return list(stmts)
+
     def convert_stmt(self, val):
         return {"type": "Convert", "value": int(val)}
 
     def condition(self, var, val):
-        return {"type": "Condition", "var": var, "value": int(val)}
+        return {"type": "Condition", "var": str(var), "value": int(val)}
 
     def id_list(self, *args):
-        return list(args)
+        return [str(a) for a in args]
 
     def GATE_NAME(self, token):
         return str(token)
@@ -61,9 +77,113 @@ class ASTBuilder(Transformer):
     def stmt(self, stmt):
         return stmt
 
-def parse_qucpl(source_code):
-    tree = parser.parse(source_code)
-    return ASTBuilder().transform(tree)
+# Parsed ASTs keyed by source hash. Callers always get a private copy so
+# mutating a returned AST can never corrupt the cache.
+_parse_cache = LRUCache(maxsize=128)
+
+# Used as the LALR parser's transformer= hook, so AST dicts are built while
+# parsing and no intermediate Tree is created. Terminal callbacks are disabled
+# (Lark requires lexer callbacks to return Tokens); the rule callbacks above
+# convert tokens themselves.
+class DirectASTBuilder(ASTBuilder):
+    GATE_NAME = None
+    CNAME = None
+    INT = None
+
+_direct_parser = None
+
+def get_direct_parser():
+    global _direct_parser
+    if _direct_parser is None:
+        _direct_parser = Lark(load_grammar(), parser='lalr', start='start', cache=True, transformer=DirectASTBuilder())
+    return _direct_parser
+
+def _parse(source_code, direct):
+    with span("parse.lark"):
+        if direct:
+            return get_direct_parser().parse(source_code)
+        return ASTBuilder().transform(get_parser().parse(source_code))
+
+def parse_qucpl(source_code, use_cache=True, direct=True):
+    with span("parse"):
+        if not use_cache:
+            return _parse(source_code, direct)
+
+        key = source_hash(source_code)
+        ast = _parse_cache.get(key)
+        if ast is None:
+            ast = _parse(source_code, direct)
+            _parse_cache.put(key, ast)
+        return clone_json(ast)
+
+# ------------------------
+# Streaming
+# ------------------------
+_STATEMENT_DELIMITERS = re.compile(r"[;{}]")
+_ELSE = re.compile(r"\s*else(?![A-Za-z0-9_])")
+
+def iter_source_statements(fh, chunk_size=1 << 16):
+    # Splits QuCPL text read from fh into top-level statements without
+    # loading the whole file: a statement ends at ';' outside any block, or at
+    # the '}' closing an if block unless an 'else' follows.
+    buffer = ""
+    start = pos = depth = 0
+    eof = False
+
+    def read_more():
+        nonlocal buffer, start, pos, eof
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            eof = True
+            return
+        buffer = buffer[start:] + chunk
+        pos -= start
+        start = 0
+
+    while True:
+        match = _STATEMENT_DELIMITERS.search(buffer, pos)
+        if match is None:
+            if eof:
+                break
+            pos = len(buffer)
+            read_more()
+            continue
+
+        ch = match.group()
+        pos = match.end()
+        if ch == "{":
+            depth += 1
+            continue
+        if ch == "}":
+            depth -= 1
+            if depth > 0:
+                continue
+            # Need enough lookahead to tell whether an else branch follows
+            while not eof and len(buffer[pos:].lstrip()) < 5:
+                read_more()
+            if _ELSE.match(buffer, pos):
+                continue
+        elif depth > 0:
+            continue
+
+        yield buffer[start:pos]
+        start = pos
+
+    if buffer[start:].strip():
+        yield buffer[start:]
+
+def iter_qucpl(fh, chunk_size=1 << 16):
+    # Yields one statement AST at a time for arbitrarily large sources
+    parser = get_direct_parser()
+    for text in iter_source_statements(fh, chunk_size):
+        if text.strip():
+            yield parser.parse(text)
+
+def parse_cache_info():
+    return _parse_cache.info()
+
+def clear_parse_cache():
+    _parse_cache.clear()
 
 if __name__ == "__main__":
     print("Enter your QuCPL code (end with a blank line):")
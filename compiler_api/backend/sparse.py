@@ -0,0 +1,201 @@
+from functools import partial
+
+import numpy as np
+
+from backend.statevector import (
+    CONTROLLED_GATES,
+    GATES,
+    StatevectorEngine,
+    exact_statevector,
+    extend_state,
+    run_statevector,
+)
+
+# ------------------------
+# Sparse statevector engine
+# ------------------------
+# A sparse state is a dict {basis index: amplitude} holding only the nonzero
+# amplitudes; qubit i is bit i of the index, the same little-endian order the
+# dense engine and Qiskit use. x/y/z/cx/cy/cz/ccx/swap only permute or phase
+# the entries, so reversible logic keeps a single amplitude however wide the
+# register is; h and fused unitaries can at most double the count.
+#
+# A branch whose state fills more than `density` of its 2**n basis states
+# is converted to the dense tensor form and carries on in the dense engine's
+# code, as long as the register is small enough to allocate.
+
+# Amplitudes smaller than this are dropped after interfering gates
+EPSILON = 1e-14
+# A dict entry costs far more than a dense amplitude, in memory and per gate
+DENSITY_THRESHOLD = 1 / 32
+DENSE_MAX_QUBITS = 24
+
+
+def sparse_gate(state, matrix, q):
+    bit = 1 << q
+    (m00, m01), (m10, m11) = matrix.tolist()
+    if m01 == 0 and m10 == 0:
+        # Diagonal (z, phases)
+        return {i: (m11 if i & bit else m00) * a for i, a in state.items()}
+    if m00 == 0 and m11 == 0:
+        # Anti-diagonal (x, y)
+        return {i ^ bit: (m01 if i & bit else m10) * a for i, a in state.items()}
+
+    new = {}
+    for i, a in state.items():
+        i0, i1 = i & ~bit, i | bit
+        to0, to1 = (m01, m11) if i & bit else (m00, m10)
+        if to0:
+            new[i0] = new.get(i0, 0) + to0 * a
+        if to1:
+            new[i1] = new.get(i1, 0) + to1 * a
+    return {i: a for i, a in new.items() if abs(a) > EPSILON}
+
+
+def sparse_controlled(state, matrix, controls, target):
+    # Only entries with every control bit set see the target gate; the gate
+    # keeps those bits set, so the two halves never collide
+    mask = sum(1 << c for c in controls)
+    hit = {i: a for i, a in state.items() if i & mask == mask}
+    if not hit:
+        return state
+    new = {i: a for i, a in state.items() if i & mask != mask}
+    new.update(sparse_gate(hit, matrix, target))
+    return new
+
+
+def sparse_swap(state, a, b):
+    bits = (1 << a) | (1 << b)
+
+    def swapped(i):
+        # Flip both bits when they differ
+        return i ^ bits if bool(i & (1 << a)) != bool(i & (1 << b)) else i
+    return {swapped(i): amp for i, amp in state.items()}
+
+
+def to_dense(state, num_qubits):
+    dense = np.zeros(1 << num_qubits, dtype=complex)
+    if state:
+        dense[np.fromiter(state.keys(), dtype=np.int64, count=len(state))] = np.fromiter(
+            state.values(), dtype=complex, count=len(state))
+    # Flat index == basis index, so this is the engine's tensor layout
+    return dense.reshape((2,) * num_qubits)
+
+
+def _sparse_distribution(outcomes, readout, names, threshold):
+    # Sparse counterpart of backend.statevector._distribution
+    shifts = [readout.get(c) for c in reversed(names)]
+    result = {}
+    for index, p in outcomes.items():
+        key = "".join("0" if q is None else str((index >> q) & 1) for q in shifts)
+        result[key] = result.get(key, 0.0) + p
+    return {key: p for key, p in result.items() if p > threshold}
+
+
+class SparseStatevectorEngine(StatevectorEngine):
+    # Branches hold either a sparse dict or a dense tensor; each primitive
+    # handles the dense ones through StatevectorEngine and the sparse ones here
+    def __init__(self, qubits=(), shots=1024, seed=None, weighted=False, density=DENSITY_THRESHOLD,
+                 dense_max_qubits=DENSE_MAX_QUBITS):
+        self.density = density
+        self.dense_max_qubits = dense_max_qubits
+        super().__init__((), shots=shots, seed=seed, weighted=weighted)
+        self.branches[0][0] = {0: 1 + 0j}
+        self.declare(qubits)
+
+    def declare(self, qubits):
+        # New qubits start in |0>, i.e. zero high bits: sparse states are unchanged
+        new = [q for q in qubits if q not in self.qmap]
+        for q in new:
+            self.qmap[q] = len(self.qmap)
+        if new:
+            for branch in self.branches:
+                if not isinstance(branch[0], dict):
+                    branch[0] = extend_state(branch[0], len(new))
+
+    def _settle(self, branch):
+        num_qubits = len(self.qmap)
+        if num_qubits <= self.dense_max_qubits and len(branch[0]) > self.density * (1 << num_qubits):
+            branch[0] = to_dense(branch[0], num_qubits)
+
+    def _apply_gate(self, op, qs, branches):
+        super()._apply_gate(op, qs, [b for b in branches if not isinstance(b[0], dict)])
+        for branch in branches:
+            if not isinstance(branch[0], dict):
+                continue
+            if op in GATES:
+                branch[0] = sparse_gate(branch[0], GATES[op], qs[0])
+            elif op in CONTROLLED_GATES:
+                num_controls, gate = CONTROLLED_GATES[op]
+                branch[0] = sparse_controlled(branch[0], GATES[gate], qs[:num_controls], qs[num_controls])
+            elif op == "swap":
+                branch[0] = sparse_swap(branch[0], qs[0], qs[1])
+            self._settle(branch)
+        return branches
+
+    def _apply_unitary(self, matrix, q, branches):
+        super()._apply_unitary(matrix, q, [b for b in branches if not isinstance(b[0], dict)])
+        for branch in branches:
+            if isinstance(branch[0], dict):
+                branch[0] = sparse_gate(branch[0], matrix, q)
+                self._settle(branch)
+        return branches
+
+    def _measure(self, branches, q, c):
+        result = super()._measure([b for b in branches if not isinstance(b[0], dict)], q, c)
+        bit = 1 << q
+        for state, bits, shots in branches:
+            if not isinstance(state, dict):
+                continue
+            ones_state = {i: a for i, a in state.items() if i & bit}
+            p1 = min(max(sum(abs(a) ** 2 for a in ones_state.values()), 0.0), 1.0)
+            for outcome, n, prob in self._split(shots, p1):
+                part = ones_state if outcome else {i: a for i, a in state.items() if not i & bit}
+                norm = np.sqrt(prob)
+                new_bits = dict(bits)
+                new_bits[c] = outcome
+                result.append([{i: a / norm for i, a in part.items()}, new_bits, n])
+        return self._check_branches(result)
+
+    def _sparse_outcomes(self, readout, conditionals):
+        # {measured bits of a basis index: probability} of the single
+        # terminal-measurement branch
+        for instr in conditionals:
+            self.classical_bits.add(instr["condition"]["var"])
+        self.classical_bits.update(readout)
+
+        mask = sum(1 << q for q in set(readout.values()))
+        outcomes = {}
+        for i, a in self.branches[0][0].items():
+            outcomes[i & mask] = outcomes.get(i & mask, 0.0) + abs(a) ** 2
+        total = sum(outcomes.values())
+        return {index: p / total for index, p in outcomes.items()}
+
+    def _sample_readout(self, readout, conditionals):
+        if not isinstance(self.branches[0][0], dict):
+            return super()._sample_readout(readout, conditionals)
+        outcomes = self._sparse_outcomes(readout, conditionals)
+        indices = list(outcomes)
+        samples = self.rng.multinomial(self.shots, np.fromiter(outcomes.values(), dtype=float, count=len(outcomes)))
+
+        self.branches = []
+        for k in np.flatnonzero(samples):
+            bits = {c: (indices[k] >> q) & 1 for c, q in readout.items()}
+            self.branches.append([None, bits, int(samples[k])])
+
+        self._print_conditionals(conditionals)
+        return self.counts()
+
+    def _readout_distribution(self, readout, conditionals):
+        if not isinstance(self.branches[0][0], dict):
+            return super()._readout_distribution(readout, conditionals)
+        outcomes = self._sparse_outcomes(readout, conditionals)
+        return partial(_sparse_distribution, outcomes, readout)
+
+
+def run_sparse(ir, shots=1024, seed=None):
+    return run_statevector(ir, shots=shots, seed=seed, engine_class=SparseStatevectorEngine)
+
+
+def exact_sparse(ir, marginals=(), threshold=0.0):
+    return exact_statevector(ir, marginals=marginals, threshold=threshold, engine_class=SparseStatevectorEngine)
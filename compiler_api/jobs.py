@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from workers import simulator_pool
+
+# ------------------------
+# Job Store Configuration
+# ------------------------
+JOB_QUEUE_SIZE = int(os.environ.get("QUICKIDE_JOB_QUEUE_SIZE", 256))
+JOB_TTL = float(os.environ.get("QUICKIDE_JOB_TTL", 600))
+JOB_CHUNK_SIZE = int(os.environ.get("QUICKIDE_JOB_CHUNK_SIZE", 16))
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, irs, shots):
+        self.id = uuid.uuid4().hex
+        self.num_circuits = len(irs)
+        self.created_at = time.time()
+        self.finished_at = None
+        self.irs = irs
+        self.shots = shots
+        # Set by start(); until then the job is queued
+        self.chunks = None
+        self.error = None
+
+    def start(self):
+        # Large submissions are split into chunks so they spread across the
+        # pool and report progress as chunks complete. Each chunk is bounded
+        # by the pool's timeout.
+        try:
+            chunks = [
+                simulator_pool.submit_many(self.irs[i:i + JOB_CHUNK_SIZE], self.shots, timeout=simulator_pool.timeout)
+                for i in range(0, len(self.irs), JOB_CHUNK_SIZE)
+            ]
+        except Exception as e:
+            self.error = str(e)
+            self.finished_at = time.monotonic()
+            return
+        finally:
+            self.irs = None
+        self.chunks = chunks
+        for future in chunks:
+            future.add_done_callback(self._on_chunk_done)
+
+    def _on_chunk_done(self, future):
+        if all(f.done() for f in self.chunks):
+            self.finished_at = time.monotonic()
+
+    def status(self):
+        if self.error is not None:
+            return "error"
+        if self.chunks is None:
+            return "queued"
+        if all(f.done() for f in self.chunks):
+            if any(f.exception() is not None for f in self.chunks):
+                return "error"
+            return "done"
+        if any(f.running() or f.done() for f in self.chunks):
+            return "running"
+        return "queued"
+
+    def to_dict(self):
+        status = self.status()
+        chunks = self.chunks or []
+        done = sum(1 for f in chunks if f.done())
+        data = {
+            "id": self.id,
+            "status": status,
+            "progress": done / len(chunks) if chunks else float(status == "done"),
+            "circuits": self.num_circuits,
+            "created_at": self.created_at,
+        }
+        if status == "done":
+            data["results"] = [r for f in self.chunks for r in f.result()]
+        elif status == "error":
+            data["error"] = self.error or next(str(f.exception()) for f in chunks if f.exception() is not None)
+        return data
+
+
+class JobStore:
+    def __init__(self, max_jobs=JOB_QUEUE_SIZE, ttl=JOB_TTL):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, irs, shots=1024):
+        for ir in irs:
+            simulator_pool.check_limits(ir)
+        with self._lock:
+            self._evict()
+            if len(self._jobs) >= self.max_jobs:
+                # Make room by dropping the oldest finished job, if any
+                finished = next((k for k, j in self._jobs.items() if j.finished_at is not None), None)
+                if finished is None:
+                    raise JobQueueFull(f"Job queue is full ({self.max_jobs} unfinished jobs)")
+                del self._jobs[finished]
+            job = Job(irs, shots)
+            self._jobs[job.id] = job
+        # Outside the lock and the request: starting the pool, or running
+        # chunks inline with QUICKIDE_SIM_WORKERS=0, can take a while
+        threading.Thread(target=job.start, daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def _evict(self):
+        # Finished jobs are kept for `ttl` seconds after completion
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and now - job.finished_at > self.ttl:
+                del self._jobs[job_id]
+
+
+job_store = JobStore()
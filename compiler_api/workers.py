@@ -0,0 +1,230 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError
+
+from backend.packed import PackedIR
+from backend.profiling import record, span
+from backend.simulator import select_backend
+
+# ------------------------
+# Pool Configuration
+# ------------------------
+# QUICKIDE_SIM_WORKERS=0 runs simulations inline in the request thread.
+SIM_WORKERS = int(os.environ.get("QUICKIDE_SIM_WORKERS", os.cpu_count() or 1))
+SIM_TIMEOUT = float(os.environ.get("QUICKIDE_SIM_TIMEOUT", 60))
+SIM_MAX_QUBITS = int(os.environ.get("QUICKIDE_SIM_MAX_QUBITS", 28))
+# Clifford-only circuits run on the stabilizer method, which scales polynomially
+SIM_MAX_CLIFFORD_QUBITS = int(os.environ.get("QUICKIDE_SIM_MAX_CLIFFORD_QUBITS", 5000))
+# Wider circuits go to the MPS method, whose cost is bounded by its bond dimension
+SIM_MAX_MPS_QUBITS = int(os.environ.get("QUICKIDE_SIM_MAX_MPS_QUBITS", 256))
+# The sparse engine's cost follows its nonzero amplitudes, not the register
+SIM_MAX_SPARSE_QUBITS = int(os.environ.get("QUICKIDE_SIM_MAX_SPARSE_QUBITS", 1024))
+
+
+# ------------------------
+# Worker Process Side
+# ------------------------
+def _warm_worker(threads_per_worker):
+    # Import Qiskit/Aer and create the backend once, before the first job
+    from backend.simulator import get_aer_backend
+    for method in (None, "stabilizer", "matrix_product_state"):
+        get_aer_backend(method).set_options(max_parallel_threads=threads_per_worker)
+
+def _worker_main(conn, threads_per_worker):
+    # One job at a time: (fn, args) in, (ok, result or exception) out.
+    # None asks the worker to exit.
+    _warm_worker(threads_per_worker)
+    conn.send(os.getpid())
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        fn, args = message
+        try:
+            reply = (True, fn(*args))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # e.g. an exception that does not pickle
+            conn.send((False, RuntimeError(str(e))))
+
+def _simulate_job(ir, title, backend, shots, fmt, options):
+    # Histograms are rendered here too, keeping matplotlib off the request
+    # thread. Stage timings travel back with the result.
+    from backend.profiling import collect
+    from backend.simulator import render_histogram, simulate
+    with collect() as profile:
+        result = simulate(ir, title=title, backend=backend, shots=shots, **options)
+        image = render_histogram(result, fmt=fmt) if result and fmt != "json" else None
+    return result, image, profile.timings()
+
+def _simulate_many_job(irs, shots):
+    from backend.simulator import simulate_many
+    return simulate_many(irs, shots=shots)
+
+
+# ------------------------
+# Request Side
+# ------------------------
+class _Worker:
+    # A worker process the pool can kill when its job overruns
+    def __init__(self, context, threads_per_worker):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, threads_per_worker), daemon=True)
+        self.process.start()
+        child.close()
+
+    def wait_ready(self):
+        # The worker reports its pid once warmed up
+        return self.conn.recv()
+
+    def run(self, fn, args, timeout):
+        # (ok, result or exception) from the job
+        self.conn.send((fn, args))
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"Simulation exceeded {timeout} seconds")
+        return self.conn.recv()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.kill()
+
+
+class SimulatorPool:
+    def __init__(self, workers=SIM_WORKERS, timeout=SIM_TIMEOUT, max_qubits=SIM_MAX_QUBITS,
+                 max_clifford_qubits=SIM_MAX_CLIFFORD_QUBITS, max_mps_qubits=SIM_MAX_MPS_QUBITS,
+                 max_sparse_qubits=SIM_MAX_SPARSE_QUBITS):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_qubits = max_qubits
+        self.max_clifford_qubits = max_clifford_qubits
+        self.max_mps_qubits = max_mps_qubits
+        self.max_sparse_qubits = max_sparse_qubits
+        # Workers waiting for a job; each job takes one out and puts it (or
+        # its replacement) back
+        self._idle = None
+        self._lock = threading.Lock()
+        # spawn: Aer's OpenMP runtime is not safe to fork from a threaded server
+        self._context = multiprocessing.get_context("spawn")
+        self._threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+
+    def start(self):
+        if self.workers <= 0 or self._idle is not None:
+            return
+        with self._lock:
+            if self._idle is not None:
+                return
+            # Every process is brought up and through the warm-up now
+            workers = [_Worker(self._context, self._threads) for _ in range(self.workers)]
+            idle = queue.Queue()
+            for worker in workers:
+                worker.wait_ready()
+                idle.put(worker)
+            self._idle = idle
+
+    def shutdown(self):
+        with self._lock:
+            if self._idle is not None:
+                while True:
+                    try:
+                        self._idle.get_nowait().stop()
+                    except queue.Empty:
+                        break
+                self._idle = None
+
+    def _dispatch(self, future, fn, args, timeout):
+        idle = self._idle
+        worker = idle.get()
+        if not future.set_running_or_notify_cancel():
+            idle.put(worker)
+            return
+        try:
+            ok, value = worker.run(fn, args, timeout)
+        except (TimeoutError, EOFError, OSError) as e:
+            # The job is still running (or the process died): kill it, so the
+            # caller only hears back once the worker is free, then replace it
+            worker.kill()
+            future.set_exception(e if isinstance(e, TimeoutError) else RuntimeError(f"Simulator worker died: {e}"))
+            worker = _Worker(self._context, self._threads)
+            worker.wait_ready()
+        else:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        idle.put(worker)
+
+    def check_limits(self, ir, mode="counts"):
+        num_qubits = len(ir.qubits) if isinstance(ir, PackedIR) else len(ir.get("qubits", []))
+        if num_qubits <= self.max_qubits:
+            return
+        backend = select_backend(ir)
+        if backend == "sparse" and num_qubits <= self.max_sparse_qubits:
+            return
+        if mode == "exact":
+            raise ValueError(f"Circuit uses {num_qubits} qubits; exact mode is limited to {self.max_qubits} "
+                             f"({self.max_sparse_qubits} on the sparse engine)")
+        if backend == "stabilizer" and num_qubits <= self.max_clifford_qubits:
+            return
+        if backend == "mps" and num_qubits <= self.max_mps_qubits:
+            return
+        raise ValueError(f"Circuit uses {num_qubits} qubits; the limit is {self.max_qubits} "
+                         f"({self.max_sparse_qubits} on the sparse engine, {self.max_clifford_qubits} for "
+                         f"Clifford-only circuits, {self.max_mps_qubits} on the MPS backend)")
+
+    def submit(self, fn, *args, timeout=None):
+        # The timeout counts from when a worker picks the job up; a job that
+        # overruns it has its worker killed and fails with TimeoutError
+        future = Future()
+        if self.workers <= 0:
+            # Inline jobs cannot be interrupted
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self.start()
+        threading.Thread(target=self._dispatch, args=(future, fn, args, timeout or self.timeout), daemon=True).start()
+        return future
+
+    def run(self, fn, *args, timeout=None):
+        return self.submit(fn, *args, timeout=timeout).result()
+
+    def simulate(self, ir, title="Simulation", backend="auto", shots=1024, fmt="json", **options):
+        # `options` are passed on to backend.simulator.simulate
+        self.check_limits(ir, options.get("mode", "counts"))
+        with span("pool"):
+            result, image, timings = self.run(_simulate_job, ir, title, backend, shots, fmt, options)
+        # Worker processes keep their own totals, so their stages are added to
+        # this process's metrics here; inline jobs already recorded them.
+        for stage, seconds in timings.items():
+            record(stage, seconds, aggregate=self.workers > 0)
+        return result, image
+
+    def simulate_many(self, irs, shots=1024):
+        for ir in irs:
+            self.check_limits(ir)
+        return self.run(_simulate_many_job, irs, shots)
+
+    def submit_many(self, irs, shots=1024, timeout=None):
+        for ir in irs:
+            self.check_limits(ir)
+        return self.submit(_simulate_many_job, irs, shots, timeout=timeout)
+
+
+simulator_pool = SimulatorPool()
@@ -6,7 +6,9 @@ import json
 from backend.parser import parse_qucpl
 from backend.visualize import visualize_circuit
 from backend.compiler import ast_to_ir
-from backend.simulator import simulate
+from backend.simulator import BACKENDS, format_convert, simulate, render_histogram
+from backend.analysis import analyze_ir, format_analysis
+from backend.profiling import collect, format_timings
 from backend.utils import open_file, save_file, format_json
 
 from ui.editor import CodeEditor
@@ -16,12 +18,23 @@ from ui.terminal import TerminalOutput
 from ui.tutorials import TutorialViewer
 from ui.histogram import HistogramViewer  # New GUI panel for simulation histogram
 
+# Menu labels for the simulator backends; any other backend in
+# backend.simulator.BACKENDS is listed under its own name
+BACKEND_LABELS = {
+    "aer": "Qiskit Aer",
+    "mps": "Qiskit Aer MPS",
+    "numpy": "NumPy Statevector",
+    "sparse": "Sparse Statevector",
+    "stabilizer": "Qiskit Aer Stabilizer",
+}
+
 
 class QuickIDE(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("QuickIDE - Quantum DSL GUI")
         self.geometry("1400x900")
+        self.sim_backend = tk.StringVar(value="auto")
         self._init_layout()
 
     def _init_layout(self):
@@ -43,7 +56,14 @@ class QuickIDE(tk.Tk):
         runmenu.add_command(label="Parse AST", command=self.run_ast)
         runmenu.add_command(label="Compile IR", command=self.run_compile)
         runmenu.add_command(label="Visualize", command=self.run_visualize)
+        runmenu.add_command(label="Analyze Circuit", command=self.run_analyze)
         runmenu.add_command(label="Simulate", command=self.run_simulate)
+
+        backendmenu = tk.Menu(runmenu, tearoff=0)
+        backendmenu.add_radiobutton(label="Automatic", variable=self.sim_backend, value="auto")
+        for name in BACKENDS:
+            backendmenu.add_radiobutton(label=BACKEND_LABELS.get(name, name), variable=self.sim_backend, value=name)
+        runmenu.add_cascade(label="Simulator Backend", menu=backendmenu)
         menubar.add_cascade(label="Run", menu=runmenu)
 
         viewmenu = tk.Menu(menubar, tearoff=0)
@@ -137,10 +157,12 @@ class QuickIDE(tk.Tk):
             messagebox.showwarning("No Input", "Editor is empty. Please enter some QuCPL code.")
             return
         try:
-            ast = parse_qucpl(code)
+            with collect() as profile:
+                ast = parse_qucpl(code)
             self.viewer.display_ast(ast)
             self.ast = ast
             self.log("[SUCCESS] AST generated.\n")
+            self.log_timings(profile)
         except Exception as e:
             self.log(f"[ERROR] AST Error: {e}\n")
 
@@ -148,10 +170,12 @@ class QuickIDE(tk.Tk):
         try:
             if not hasattr(self, 'ast'):
                 self.run_ast()
-            ir = ast_to_ir(self.ast)
+            with collect() as profile:
+                ir = ast_to_ir(self.ast)
             self.ir = ir
             self.viewer.display_ir(ir)
             self.log("[SUCCESS] IR compilation done.\n")
+            self.log_timings(profile)
         except Exception as e:
             self.log(f"[ERROR] Compilation Error: {e}\n")
 
@@ -159,18 +183,33 @@ class QuickIDE(tk.Tk):
         try:
             if not hasattr(self, 'ir'):
                 self.run_compile()
-            self.visualizer.display_circuit(self.ir, title="Quantum Circuit")
+            with collect() as profile:
+                self.visualizer.display_circuit(self.ir, title="Quantum Circuit")
             self.log("[SUCCESS] Circuit visualized.\n")
+            self.log_timings(profile)
         except Exception as e:
             self.log(f"[ERROR] Visualization Error: {e}\n")
 
+    def run_analyze(self):
+        try:
+            if not hasattr(self, 'ir'):
+                self.run_compile()
+            self.log(format_analysis(analyze_ir(self.ir)) + "\n")
+            self.log("[SUCCESS] Circuit analysis done.\n")
+        except Exception as e:
+            self.log(f"[ERROR] Analysis Error: {e}\n")
+
     def run_simulate(self):
         try:
             if not hasattr(self, 'ir'):
                 self.run_compile()
-            histogram_img = simulate(self.ir, title="Simulation")
-            self.histogram.display_histogram(histogram_img)
+            with collect() as profile:
+                result = simulate(self.ir, title="Simulation", backend=self.sim_backend.get())
+                if "convert" in result:
+                    self.log(format_convert(result["convert"]) + "\n")
+                self.histogram.display_histogram(render_histogram(result))
             self.log("[SUCCESS] Simulation complete.\n")
+            self.log_timings(profile)
         except Exception as e:
             self.log(f"[ERROR] Simulation Error: {e}\n")
 
@@ -182,6 +221,11 @@ class QuickIDE(tk.Tk):
         if hasattr(self, 'console'):
             self.console.log(message)
 
+    def log_timings(self, profile):
+        timings = profile.timings()
+        if timings:
+            self.log(f"[TIMING] {format_timings(timings)}\n")
+
     def load_tutorial(self):
         self.tutorial_viewer.load_tutorial()
 
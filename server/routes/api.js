@@ -112,4 +112,30 @@ router.post('/run/simulate', async (req, res) => {
   }
 });
 
+// Parse, compile and simulate in a single round trip
+router.post('/run/run', async (req, res) => {
+  try {
+    const { code, backend, shots, include } = req.body;
+    const response = await axios.post(`${PYTHON_API_URL}/run`, { code, backend, shots, include });
+    res.json(response.data);
+  } catch (err) {
+    const status = err.response?.status || 500;
+    const error = err.response?.data?.error || err.message;
+    res.status(status).json({ error });
+  }
+});
+
+// Depth, layers and critical path for an IR (or source code)
+router.post('/run/analyze', async (req, res) => {
+  try {
+    const { ir, code } = req.body;
+    const response = await axios.post(`${PYTHON_API_URL}/analyze`, ir ? { ir } : { code });
+    res.json(response.data);
+  } catch (err) {
+    const status = err.response?.status || 500;
+    const error = err.response?.data?.error || err.message;
+    res.status(status).json({ error });
+  }
+});
+
 module.exports = router;
\ No newline at end of file